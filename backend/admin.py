@@ -1,7 +1,11 @@
 import datetime
 import uuid
 from bson import ObjectId
+from pymongo import ReturnDocument
 from config import mongo_db
+from catalog import food_catalog
+from community import community_set
+from restaurants import restaurant_directory
 
 def fetch_pending_suggestions(limit=50):
     return list(mongo_db.community_suggestions.find({"status": "pending"}).sort("timestamp", 1).limit(limit))
@@ -15,22 +19,27 @@ def approve_suggestion(suggestion_id: str):
         return False
     if "restaurant" in text.lower():
         rid = f"r_comm_{uuid.uuid4().hex[:8]}"
-        mongo_db.restaurants.insert_one({
+        restaurant_doc = {
             "restaurant_id": rid,
             "restaurant_name": text,
             "community_source": True,
             "created_at": datetime.datetime.utcnow().isoformat()
-        })
+        }
+        mongo_db.restaurants.insert_one(restaurant_doc)
+        restaurant_directory.put(restaurant_doc)
+        fid = None
     else:
         fid = f"f_comm_{uuid.uuid4().hex[:8]}"
-        mongo_db.foods.insert_one({
+        food_doc = {
             "food_id": fid,
             "food_name": text,
             "restaurant_id": "r_unknown",
             "description": "Community suggested item",
             "community_source": True,
             "created_at": datetime.datetime.utcnow().isoformat()
-        })
+        }
+        mongo_db.foods.insert_one(food_doc)
+        food_catalog.put(food_doc)
         mongo_db.community_suggestions.update_one(
             {"_id": sug["_id"]},
             {"$set": {"food_id": fid}}
@@ -39,13 +48,17 @@ def approve_suggestion(suggestion_id: str):
         {"_id": sug["_id"]},
         {"$set": {"status": "approved", "approved_at": datetime.datetime.utcnow().isoformat()}}
     )
+    community_set.on_status_change(sug, "approved", fid)
     return True
 
 def reject_suggestion(suggestion_id: str):
-    mongo_db.community_suggestions.update_one(
+    before = mongo_db.community_suggestions.find_one_and_update(
         {"_id": ObjectId(suggestion_id)},
-        {"$set": {"status": "rejected", "rejected_at": datetime.datetime.utcnow().isoformat()}}
+        {"$set": {"status": "rejected", "rejected_at": datetime.datetime.utcnow().isoformat()}},
+        return_document=ReturnDocument.BEFORE
     )
+    if before:
+        community_set.on_status_change(before, "rejected")
     return True
 
 def reviewed_suggestions(limit=50):
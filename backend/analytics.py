@@ -1,6 +1,7 @@
 import datetime
 from config import mongo_db
-from recommender import _trending_foods
+from recommender import _trending_foods, candidate_source_stats
+from groq_api import llm_cache
 
 def user_count():
     return mongo_db.users.count_documents({})
@@ -38,6 +39,8 @@ def system_health():
         pass
     if all([status["mongo"], status["neo4j"], status["qdrant"]]):
         status["status"] = "healthy"
+    status["candidate_sources"] = candidate_source_stats()
+    status["llm_cache"] = llm_cache.stats()
     return status
 
 def recent_errors(limit=15):
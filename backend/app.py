@@ -1,25 +1,76 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context, g
 from flask_cors import CORS
+import json
+import time
+import threading
 import logging
 import datetime
 from models import User, Feedback
 from util import hash_password, check_password, encode_auth_token, decode_auth_token
-from recommender import hybrid_food_recommend, recommend_restaurants_from_foods, get_user_liked_foods, get_user
-from dialogue_manager import process_message
+from recommender import hybrid_food_recommend, recommend_restaurants_for_user, get_user
+from dialogue_manager import process_message, stream_message
 from feedback import log_feedback, get_feedback_stats
+from feedback_queue import FeedbackBackpressure
 from analytics import user_count, trending_foods_dashboard, feedback_analytics, system_health, recent_errors, log_error
 from admin import (
     fetch_pending_suggestions, approve_suggestion, reject_suggestion, upvote_food, downvote_food,
     reviewed_suggestions, get_recent_admin_actions, log_admin_action
 )
 from kgensam import get_fuzzy_attributes, calculate_attribute_uncertainty, explain_recommendation
-from config import mongo_db
+from config import mongo_db, warmup, TRAFFIC_CAPTURE_PATH, TRAFFIC_CAPTURE_SAMPLE
+from metrics import render as render_metrics, http_request_seconds, http_requests_total
+from traffic_capture import TrafficRecorder, capture_entry
 
 app = Flask(__name__)
 CORS(app, supports_credentials=True)
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("app")
 
+traffic_recorder = TrafficRecorder(TRAFFIC_CAPTURE_PATH, TRAFFIC_CAPTURE_SAMPLE) if TRAFFIC_CAPTURE_PATH else None
+
+_warmed_up = threading.Event()
+_warmup_lock = threading.Lock()
+
+@app.before_request
+def _ensure_warmup():
+    # WSGI servers (gunicorn etc.) import `app` without running __main__, so each worker
+    # warms up on its first request; a failed warmup is retried by the next one
+    if not _warmed_up.is_set():
+        with _warmup_lock:
+            if not _warmed_up.is_set():
+                warmup()
+                _warmed_up.set()
+
+@app.cli.command("warmup")
+def warmup_command():
+    """Checks Mongo and provisions Qdrant collections (`flask --app app warmup`)."""
+    warmup()
+    _warmed_up.set()
+
+@app.before_request
+def _start_timer():
+    g.request_started = time.perf_counter()
+    g.request_started_wall = time.time()
+
+@app.after_request
+def _record_request(response):
+    started = g.get("request_started")
+    if started is not None:
+        # Route pattern, not the raw path, keeps label cardinality bounded. Streamed bodies
+        # are timed up to the first byte.
+        endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+        http_request_seconds.observe(time.perf_counter() - started, endpoint=endpoint, method=request.method)
+        http_requests_total.inc(endpoint=endpoint, method=request.method, status=str(response.status_code))
+        if traffic_recorder and traffic_recorder.should_record(request.path):
+            _capture(response, started)
+    return response
+
+def _capture(response, started: float):
+    body = request.get_json(silent=True) if request.is_json else None
+    user_id = request.args.get("user_id") or (body.get("user_id") if isinstance(body, dict) else None) or require_auth()
+    traffic_recorder.record(capture_entry(request, response, g.request_started_wall,
+                                          (time.perf_counter() - started) * 1000, user_id))
+
 def require_auth():
     token = request.headers.get("Authorization", "").replace("Bearer ", "").strip()
     user_id = decode_auth_token(token)
@@ -67,6 +118,27 @@ def chat():
         log_error("chat", str(e))
         return jsonify(success=False, message="Internal error"), 500
 
+@app.post("/api/chat/stream")
+def chat_stream():
+    data = request.json or {}
+    user_id = data.get("user_id") or require_auth()
+    if not user_id:
+        return jsonify(success=False, message="Unauthorized"), 401
+    session_id = data.get("session_id", f"{user_id}_session")
+    message = data.get("message", "")
+
+    def events():
+        try:
+            for event in stream_message(user_id, session_id, message):
+                name = event.pop("event")
+                yield f"event: {name}\ndata: {json.dumps(event)}\n\n"
+        except Exception as e:
+            log_error("chat_stream", str(e))
+            yield f"event: error\ndata: {json.dumps({'success': False, 'message': 'Internal error'})}\n\n"
+
+    return Response(stream_with_context(events()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 @app.post("/api/recommend_food")
 def recommend_food():
     data = request.json or {}
@@ -84,9 +156,7 @@ def recommend_restaurants():
     user_id = request.args.get("user_id") or require_auth()
     if not user_id:
         return jsonify(success=False, message="Unauthorized"), 401
-    liked_foods = get_user_liked_foods(user_id)
-    results = recommend_restaurants_from_foods(liked_foods)
-    return jsonify(results)
+    return jsonify(recommend_restaurants_for_user(user_id))
 
 @app.post("/api/kgen/fuzzy")
 def kgen_fuzzy():
@@ -121,7 +191,10 @@ def feedback():
         fb = Feedback(**data)
     except TypeError:
         return jsonify(success=False, message="Invalid feedback payload"), 400
-    log_feedback(fb)
+    try:
+        log_feedback(fb)
+    except FeedbackBackpressure:
+        return jsonify(success=False, message="Feedback queue is busy, please retry"), 503, {"Retry-After": "1"}
     return jsonify(success=True)
 
 @app.get("/api/feedback/analytics")
@@ -157,6 +230,10 @@ def analytics_trending():
 def system_health_api():
     return jsonify(system_health())
 
+@app.get("/api/metrics")
+def metrics():
+    return Response(render_metrics(), mimetype="text/plain; version=0.0.4")
+
 @app.get("/api/errors/recent")
 def errors_recent():
     return jsonify(recent_errors(15))
@@ -203,4 +280,6 @@ def global_error(e):
     return jsonify(success=False, message="Internal server error"), 500
 
 if __name__ == "__main__":
+    warmup()
+    _warmed_up.set()
     app.run(port=8000, host="0.0.0.0")
\ No newline at end of file
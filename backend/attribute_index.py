@@ -0,0 +1,175 @@
+import re
+import numpy as np
+from typing import Any, Dict, Iterable, List, Sequence
+
+# Bitmap index over food attributes: one boolean mask (over row ids) per normalized value.
+# Filters combine masks with & / | / ~, so any combination resolves without touching rows.
+
+INDEX_FIELDS = ["veg_nonveg", "category", "popular_in", "price_level", "spice_level", "cuisine", "dish_type", "area"]
+
+FilterValue = str | Sequence[str]
+
+def normalize(value: Any) -> str:
+    """'Non-Veg' -> 'non veg', 'Curd / Rice Items' -> 'curd rice items'."""
+    return " ".join(re.findall(r"[a-z0-9]+", str(value or "").lower()))
+
+class AttributeIndex:
+    """One row per catalog/vector row. food_id is not a row key: raw food.csv repeats ids across
+    dishes, so id-level lookups (contains, first_row) look at all of an id's rows."""
+
+    def __init__(self, food_ids: List[str], rows: Iterable[Dict[str, Any]], fields: Sequence[str] = INDEX_FIELDS):
+        self.food_ids = list(food_ids)
+        self.rows: List[Dict[str, Any]] = []
+        self.rows_of: Dict[str, List[int]] = {}
+        for i, fid in enumerate(self.food_ids):
+            self.rows_of.setdefault(fid, []).append(i)
+        self._code_of = {fid: c for c, fid in enumerate(self.rows_of)}
+        self._codes = np.array([self._code_of[fid] for fid in self.food_ids], dtype=np.int64)
+        self.size = len(self.food_ids)
+        self.fields = list(fields)
+        self.version = 0
+        self._values: Dict[str, Dict[str, np.ndarray]] = {f: {} for f in self.fields}
+        self._tokens: Dict[str, Dict[str, np.ndarray]] = {f: {} for f in self.fields}
+        self._counts: Dict[str, Dict[str, int]] = {f: {} for f in self.fields}
+        self._raw: Dict[str, Dict[str, set]] = {f: {} for f in self.fields}
+        columns = {f: [] for f in self.fields}
+        for row in rows:
+            self.rows.append(row)
+            for f in self.fields:
+                value = normalize(row.get(f))
+                columns[f].append(value)
+                if value:
+                    self._raw[f].setdefault(value, set()).add(str(row.get(f)))
+        for f in self.fields:
+            if not columns[f]:
+                continue
+            uniq, codes = np.unique(np.array(columns[f]), return_inverse=True)
+            for code, value in enumerate(uniq):
+                if not value:
+                    continue
+                mask = codes == code
+                self._values[f][value] = mask
+                self._counts[f][value] = int(mask.sum())
+                for token in value.split():
+                    prev = self._tokens[f].get(token)
+                    self._tokens[f][token] = mask if prev is None else prev | mask
+
+    @classmethod
+    def from_payloads(cls, payloads: List[Dict[str, Any]], fields: Sequence[str] = INDEX_FIELDS) -> "AttributeIndex":
+        return cls([str(p.get("food_id")) for p in payloads], payloads, fields)
+
+    # --- Masks ---
+    def none(self) -> np.ndarray:
+        return np.zeros(self.size, dtype=bool)
+
+    def all(self) -> np.ndarray:
+        return np.ones(self.size, dtype=bool)
+
+    def has_field(self, field: str) -> bool:
+        """False when no row carries a value for `field` (e.g. spice_level in food.csv)."""
+        return bool(self._values.get(field))
+
+    def term(self, field: str, value: str) -> np.ndarray:
+        """Rows whose `field` equals `value` after normalization.
+
+        Free-text answers are resolved too: every indexed value that appears as whole words in
+        `value` matches ("i want non veg" -> 'non veg', not 'veg'). Failing that, rows whose value
+        contains all of the answer's known words match ("south" -> 'south india').
+        """
+        values = self._values.get(field, {})
+        query = normalize(value)
+        if not query:
+            return self.none()
+        exact = values.get(query)
+        if exact is not None:
+            return exact.copy()
+        padded = f" {query} "
+        found = [v for v in values if f" {v} " in padded]
+        found = [v for v in found if not any(v != o and f" {v} " in f" {o} " for o in found)]
+        if found:
+            return self.any_of(field, found)
+        tokens = self._tokens.get(field, {})
+        known = [tokens[t] for t in query.split() if t in tokens]
+        if not known:
+            return self.none()
+        return np.logical_and.reduce(known)
+
+    def any_of(self, field: str, values: Iterable[str]) -> np.ndarray:
+        mask = self.none()
+        for v in values:
+            mask |= self.term(field, v)
+        return mask
+
+    def select(self, filters: Dict[str, FilterValue] | None, exclude: Dict[str, FilterValue] | None = None,
+               known_only: bool = True) -> np.ndarray:
+        """AND across fields, OR within a list of values, NOT for `exclude`.
+
+        With known_only, fields no row has a value for are skipped instead of matching nothing.
+        """
+        mask = self.all()
+        for field, val in (filters or {}).items():
+            if not val or (known_only and not self.has_field(field)):
+                continue
+            mask &= self.term(field, val) if isinstance(val, str) else self.any_of(field, val)
+        for field, val in (exclude or {}).items():
+            if val:
+                mask &= ~(self.term(field, val) if isinstance(val, str) else self.any_of(field, val))
+        return mask
+
+    # --- Cardinality ---
+    def count(self, field: str, value: str) -> int:
+        cached = self._counts.get(field, {}).get(normalize(value))
+        return cached if cached is not None else int(self.term(field, value).sum())
+
+    def estimate(self, filters: Dict[str, FilterValue] | None) -> int:
+        """Match count from per-value counts, assuming fields are independent (no mask work)."""
+        fraction = 1.0
+        for field, val in (filters or {}).items():
+            if not val or not self.has_field(field):
+                continue
+            vals = [val] if isinstance(val, str) else list(val)
+            fraction *= min(sum(self.count(field, v) for v in vals), self.size) / max(self.size, 1)
+        return int(round(fraction * self.size))
+
+    def values(self, field: str) -> Dict[str, int]:
+        return dict(self._counts.get(field, {}))
+
+    def raw_values(self, field: str, value: str) -> List[str]:
+        """Stored spellings of the values term() resolves `value` to ('veg' -> ['Veg'])."""
+        values = self._values.get(field, {})
+        query = normalize(value)
+        if not query:
+            return []
+        if query in values:
+            matched = [query]
+        else:
+            padded = f" {query} "
+            matched = [v for v in values if f" {v} " in padded]
+            matched = [v for v in matched if not any(v != o and f" {v} " in f" {o} " for o in matched)]
+            if not matched:
+                known = [t for t in query.split() if t in self._tokens.get(field, {})]
+                matched = [v for v in values if known and all(t in v.split() for t in known)]
+        return sorted(set().union(*(self._raw[field][v] for v in matched))) if matched else []
+
+    # --- Row <-> id ---
+    def ids(self, mask: np.ndarray, limit: int | None = None) -> List[str]:
+        """Distinct food ids of the rows in `mask`, in row order."""
+        ids = list(dict.fromkeys(self.food_ids[i] for i in np.flatnonzero(mask)))
+        return ids if limit is None else ids[:limit]
+
+    def contains(self, food_ids: Sequence[str], mask: np.ndarray) -> np.ndarray:
+        """Whether any row of each id is in `mask`; ids the index doesn't know are dropped (False)."""
+        hit = np.zeros(len(self._code_of), dtype=bool)
+        hit[self._codes[mask]] = True
+        codes = np.array([self._code_of.get(fid, -1) for fid in food_ids], dtype=np.int64)
+        out = np.zeros(len(codes), dtype=bool)
+        known = codes >= 0
+        out[known] = hit[codes[known]]
+        return out
+
+    def first_row(self, food_id: str, mask: np.ndarray | None = None) -> int | None:
+        """The id's first row, or its first row inside `mask`."""
+        for row in self.rows_of.get(food_id, ()):
+            if mask is None or mask[row]:
+                return row
+        return None
@@ -0,0 +1,120 @@
+import threading
+import time
+import logging
+from typing import Dict, Iterable, List, Optional, Any
+from config import mongo_db, CONFIG
+from models import Food
+from attribute_index import AttributeIndex
+
+logger = logging.getLogger("catalog")
+
+def _by_food_id(rows: Iterable[Food], foods: Dict[str, Food] | None = None) -> Dict[str, Food]:
+    # A food_id on several rows (raw food.csv) resolves to its first row, as in the vector index
+    foods = dict(foods or {})
+    for food in rows:
+        foods.setdefault(food.food_id, food)
+    return foods
+
+class FoodCatalog:
+    """Read-through in-memory snapshot of the foods collection.
+
+    Rows are keyed by Mongo _id; get()/get_many() resolve a food_id to one row, while the
+    attribute index covers every row.
+    """
+
+    def __init__(self, collection, refresh_seconds: int):
+        self._collection = collection
+        self._refresh_seconds = refresh_seconds
+        self._rows: Dict[Any, Food] = {}
+        self._foods: Dict[str, Food] = {}
+        self._missing: set = set()
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+        self._attributes: Optional[AttributeIndex] = None
+        self.version = 0
+
+    def refresh(self) -> int:
+        rows = {}
+        for doc in self._collection.find({}):
+            rows[doc["_id"]] = Food.from_payload(doc)
+        foods = _by_food_id(rows.values())
+        with self._lock:
+            self._rows = rows
+            self._foods = foods
+            self._missing = set()
+            self._loaded_at = time.monotonic()
+            self.version += 1
+        logger.info(f"Food catalog loaded {len(foods)} foods (version {self.version})")
+        return self.version
+
+    def _ensure_fresh(self):
+        if not self._loaded_at or time.monotonic() - self._loaded_at > self._refresh_seconds:
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.warning(f"Food catalog refresh failed: {e}")
+                self._loaded_at = time.monotonic()
+
+    def _load_missing(self, food_ids: List[str]):
+        try:
+            docs = list(self._collection.find({"food_id": {"$in": food_ids}}))
+        except Exception as e:
+            logger.warning(f"Food catalog lookup failed: {e}")
+            return
+        with self._lock:
+            rows = dict(self._rows)
+            for doc in docs:
+                rows[doc["_id"]] = Food.from_payload(doc)
+            foods = _by_food_id((Food.from_payload(doc) for doc in docs), self._foods)
+            self._missing.update(fid for fid in food_ids if fid not in foods)
+            self._rows = rows
+            self._foods = foods
+            if docs:
+                self.version += 1
+
+    def get_many(self, food_ids: Iterable[str]) -> List[Food]:
+        self._ensure_fresh()
+        ids = [fid for fid in food_ids if fid]
+        missing = list({fid for fid in ids if fid not in self._foods and fid not in self._missing})
+        if missing:
+            self._load_missing(missing)
+        foods = self._foods
+        return [foods[fid] for fid in ids if fid in foods]
+
+    def get(self, food_id: str) -> Optional[Food]:
+        found = self.get_many([food_id])
+        return found[0] if found else None
+
+    def all(self) -> List[Food]:
+        self._ensure_fresh()
+        return list(self._foods.values())
+
+    def attributes(self) -> AttributeIndex:
+        """Bitmap attribute index over the current snapshot, rebuilt when the catalog version changes."""
+        self._ensure_fresh()
+        index = self._attributes
+        if index is None or index.version != self.version:
+            with self._lock:
+                version, rows = self.version, list(self._rows.values())
+            index = AttributeIndex([f.food_id for f in rows], (f.to_dict() for f in rows))
+            index.version = version
+            self._attributes = index
+        return index
+
+    def put(self, doc: Dict[str, Any]) -> Food:
+        food = Food.from_payload(doc)
+        with self._lock:
+            rows = dict(self._rows)
+            rows[doc.get("_id", food.food_id)] = food
+            self._rows = rows
+            foods = dict(self._foods)
+            foods[food.food_id] = food
+            self._missing.discard(food.food_id)
+            self._foods = foods
+            self.version += 1
+        return food
+
+    def __len__(self):
+        return len(self._foods)
+
+food_catalog = FoodCatalog(mongo_db.foods, CONFIG["catalog_refresh_seconds"])
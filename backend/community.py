@@ -0,0 +1,87 @@
+import time
+import random
+import logging
+import threading
+from typing import Dict, List, Optional
+from pymongo import ReturnDocument
+from config import mongo_db, CONFIG
+
+logger = logging.getLogger("community")
+
+STATE_ID = "approved"
+
+class CommunitySet:
+    """Approved community food ids and approval count, kept in one mongo_db.community_state doc.
+
+    Admin actions update the doc and bump its version; each worker polls only the
+    version (one _id lookup every poll_seconds) and reloads the set when it changes.
+    """
+
+    def __init__(self, state_collection, suggestions, poll_seconds: int):
+        self._state = state_collection
+        self._suggestions = suggestions
+        self.poll_seconds = poll_seconds
+        self._food_ids: List[str] = []
+        self._count = 0
+        self._version = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def _load(self, doc: Optional[Dict]):
+        doc = doc or {}
+        with self._lock:
+            self._food_ids = list(doc.get("food_ids", []))
+            self._count = max(int(doc.get("count", 0)), 0)
+            self._version = doc.get("version", 0)
+            self._checked_at = time.monotonic()
+
+    def _ensure_fresh(self):
+        if self._version is not None and time.monotonic() - self._checked_at < self.poll_seconds:
+            return
+        try:
+            head = self._state.find_one({"_id": STATE_ID}, {"version": 1}) or {}
+            if head.get("version", 0) != self._version:
+                self._load(self._state.find_one({"_id": STATE_ID}))
+            else:
+                self._checked_at = time.monotonic()
+        except Exception as e:
+            logger.warning(f"Community state refresh failed: {e}")
+            self._checked_at = time.monotonic()
+
+    def count(self) -> int:
+        self._ensure_fresh()
+        return self._count
+
+    def sample(self, k: int) -> List[str]:
+        self._ensure_fresh()
+        ids = self._food_ids
+        return random.sample(ids, min(k, len(ids)))
+
+    def on_status_change(self, before: Dict, status: str, food_id: str | None = None):
+        """Applies one suggestion's status transition (before = the doc prior to the update)."""
+        was = before.get("status") == "approved"
+        now = status == "approved"
+        old_fid = before.get("food_id") if was else None
+        new_fid = food_id if now else None
+        if not was and not now:
+            return
+        update = {"$inc": {"version": 1, "count": int(now) - int(was)}}
+        if old_fid and old_fid != new_fid:
+            self._state.update_one({"_id": STATE_ID}, {"$pull": {"food_ids": old_fid}}, upsert=True)
+        if new_fid and new_fid != old_fid:
+            update["$addToSet"] = {"food_ids": new_fid}
+        self._load(self._state.find_one_and_update({"_id": STATE_ID}, update, upsert=True,
+                                                   return_document=ReturnDocument.AFTER))
+
+    def rebuild(self) -> int:
+        """Recomputes the set and count from community_suggestions."""
+        approved = list(self._suggestions.find({"status": "approved"}, {"food_id": 1}))
+        food_ids = list(dict.fromkeys(s["food_id"] for s in approved if s.get("food_id")))
+        self._load(self._state.find_one_and_update(
+            {"_id": STATE_ID},
+            {"$set": {"food_ids": food_ids, "count": len(approved)}, "$inc": {"version": 1}},
+            upsert=True, return_document=ReturnDocument.AFTER))
+        logger.info(f"Community set rebuilt: {len(approved)} approved, {len(food_ids)} foods")
+        return len(approved)
+
+community_set = CommunitySet(mongo_db.community_state, mongo_db.community_suggestions, CONFIG["community_poll_seconds"])
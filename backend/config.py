@@ -1,12 +1,11 @@
 import os
 import logging
+import threading
 from dotenv import load_dotenv
 from pymongo import MongoClient
 from pymongo.errors import PyMongoError
-from qdrant_client import QdrantClient
-from qdrant_client.http import models as qmodels
-from neo4j import GraphDatabase
-import google.generativeai as genai
+import numpy as np
+from embed_cache import EmbeddingCache
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 ENV_PATH = os.path.join(BASE_DIR, ".env")
@@ -36,47 +35,120 @@ OPENAI_API_KEY  = os.getenv("OPENAI_API_KEY")
 
 GEMINI_EMBED_MODEL = os.getenv("GEMINI_EMBED_MODEL", "models/text-embedding-004")
 QDRANT_TIMEOUT     = int(os.getenv("QDRANT_TIMEOUT", "45"))
+VECTOR_BACKEND     = os.getenv("VECTOR_BACKEND", "qdrant")  # "qdrant" or "local"
+LOCAL_VECTOR_PATH  = os.getenv("LOCAL_VECTOR_PATH", os.path.join(BASE_DIR, "data", "food_vectors.npz"))
+FEEDBACK_WRITE_BEHIND = os.getenv("FEEDBACK_WRITE_BEHIND", "1") == "1"
+SESSION_BACKEND    = os.getenv("SESSION_BACKEND", "memory")  # "memory" or "mongo"
+EMBED_CACHE_SIZE   = int(os.getenv("EMBED_CACHE_SIZE", "4096"))
+EMBED_CACHE_PATH   = os.getenv("EMBED_CACHE_PATH", os.path.join(BASE_DIR, ".cache", "embeddings.sqlite"))
+ITEM_NEIGHBORS_PATH = os.getenv("ITEM_NEIGHBORS_PATH", os.path.join(BASE_DIR, "data", "item_neighbors.npz"))
+MF_MODEL_PATH      = os.getenv("MF_MODEL_PATH", os.path.join(BASE_DIR, "data", "mf_factors.npz"))
+TRAFFIC_CAPTURE_PATH   = os.getenv("TRAFFIC_CAPTURE_PATH", "")  # empty = capture off
+TRAFFIC_CAPTURE_SAMPLE = float(os.getenv("TRAFFIC_CAPTURE_SAMPLE", "1.0"))
 
-# MongoDB
-try:
-    mongo_client = MongoClient(MONGODB_URI, serverSelectionTimeoutMS=8000)
-    mongo_client.admin.command("ping")
-except PyMongoError as e:
-    logger.error(f"Mongo connection failed: {e}")
-    raise
+class LazyService:
+    """Proxy that builds a client on first use (once per process) instead of at import time."""
+
+    def __init__(self, name: str, factory):
+        self._name = name
+        self._factory = factory
+        self._instance = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        if self._instance is None or self._pid != os.getpid():
+            with self._lock:
+                if self._instance is None or self._pid != os.getpid():
+                    logger.info(f"Connecting to {self._name}")
+                    self._instance = self._factory()
+                    self._pid = os.getpid()
+        return self._instance
+
+    def __getattr__(self, item):
+        return getattr(self.get(), item)
+
+    def __repr__(self):
+        state = "connected" if self._instance is not None else "not connected"
+        return f"<LazyService {self._name} ({state})>"
+
+# MongoDB: connect=False defers sockets and monitor threads to the first operation
+mongo_client = MongoClient(MONGODB_URI, serverSelectionTimeoutMS=8000, connect=False)
 mongo_db = mongo_client["food_recommender"]
 
 # Qdrant
-qdrant = QdrantClient(url=QDRANT_URL, api_key=QDRANT_API_KEY, timeout=QDRANT_TIMEOUT)
+def _make_qdrant():
+    from qdrant_client import QdrantClient
+    return QdrantClient(url=QDRANT_URL, api_key=QDRANT_API_KEY, timeout=QDRANT_TIMEOUT)
+
+qdrant = LazyService("qdrant", _make_qdrant)
 
 # Neo4j
-neo4j_driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASS))
+def _make_neo4j():
+    from neo4j import GraphDatabase
+    return GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASS))
+
+neo4j_driver = LazyService("neo4j", _make_neo4j)
 
 # Gemini
-genai.configure(api_key=GEMINI_API_KEY)
+_genai = None
 _gemini_error_logged = False
+embed_cache = EmbeddingCache(max_entries=EMBED_CACHE_SIZE, path=EMBED_CACHE_PATH)
+
+def gemini():
+    global _genai
+    if _genai is None:
+        import google.generativeai as genai
+        genai.configure(api_key=GEMINI_API_KEY)
+        _genai = genai
+    return _genai
 
 def get_gemini_embedding(text: str, model: str | None = None):
+    return get_gemini_embedding_vector(text, model).tolist()
+
+def get_gemini_embedding_vector(text: str, model: str | None = None) -> np.ndarray:
     global _gemini_error_logged
     if not text or not text.strip():
-        return [0.0] * 768
+        return np.zeros(768, dtype=np.float32)
     model_name = model or GEMINI_EMBED_MODEL
+    cached = embed_cache.get(model_name, text)
+    if cached is not None:
+        return cached
     try:
-        resp = genai.embed_content(model=model_name, content=text)
+        resp = gemini().embed_content(model=model_name, content=text)
         emb = resp.get("embedding")
         if not emb:
             raise ValueError("No embedding returned")
-        return emb
+        return embed_cache.put(model_name, text, emb)
     except Exception as e:
         if not _gemini_error_logged:
             logger.warning(f"Gemini embed error (showing once): {e}")
             _gemini_error_logged = True
-        # Deterministic fallback using hash
-        import hashlib
-        h = hashlib.sha256(text.encode("utf-8")).digest()
-        repeat_times = 768 // len(h) + 1
-        raw = (h * repeat_times)[:768]
-        return [b / 255.0 for b in raw]
+        # Fallback vectors are not cached so a recovered API gets a chance next time
+        return _fallback_embedding(text)
+
+def get_gemini_embeddings(texts: list[str], model: str | None = None) -> list[np.ndarray]:
+    """Batch variant for bulk jobs: one Gemini request for all cache misses, errors are raised."""
+    model_name = model or GEMINI_EMBED_MODEL
+    out: list[np.ndarray | None] = [embed_cache.get(model_name, t) if t and t.strip() else np.zeros(768, dtype=np.float32)
+                                    for t in texts]
+    missing = [i for i, vec in enumerate(out) if vec is None]
+    if missing:
+        resp = gemini().embed_content(model=model_name, content=[texts[i] for i in missing])
+        embs = resp.get("embedding") or []
+        if len(embs) != len(missing):
+            raise ValueError(f"Expected {len(missing)} embeddings, got {len(embs)}")
+        for i, emb in zip(missing, embs):
+            out[i] = embed_cache.put(model_name, texts[i], emb)
+    return out
+
+def _fallback_embedding(text: str) -> np.ndarray:
+    # Deterministic fallback using hash
+    import hashlib
+    h = hashlib.sha256(text.encode("utf-8")).digest()
+    repeat_times = 768 // len(h) + 1
+    raw = (h * repeat_times)[:768]
+    return np.array([b / 255.0 for b in raw], dtype=np.float32)
 
 CONFIG = {
     "user_vector_size": 768,
@@ -87,19 +159,81 @@ CONFIG = {
     "max_attribute_questions": 4,
     "active_attributes": ["spice_level", "veg_nonveg", "cuisine", "area"],
     "max_food_vector_candidates": 80,
+    "catalog_refresh_seconds": int(os.getenv("CATALOG_REFRESH_SECONDS", "300")),
+    "restaurant_refresh_seconds": int(os.getenv("RESTAURANT_REFRESH_SECONDS", "300")),
+    "kgensam_cache_size": int(os.getenv("KGENSAM_CACHE_SIZE", "10000")),
+    "kgensam_cache_ttl_seconds": int(os.getenv("KGENSAM_CACHE_TTL_SECONDS", "600")),
+    "feedback_queue_depth": int(os.getenv("FEEDBACK_QUEUE_DEPTH", "10000")),
+    "feedback_batch_size": 200,
+    "feedback_linger_seconds": 0.5,
+    "feedback_enqueue_timeout": 0.5,
+    "user_vector_half_life_days": float(os.getenv("USER_VECTOR_HALF_LIFE_DAYS", "30")),
+    "user_vector_dislike_weight": 1.0,
+    "trending_top_k": 50,
+    "trending_half_life_hours": float(os.getenv("TRENDING_HALF_LIFE_HOURS", "168")),
+    "trending_refresh_seconds": int(os.getenv("TRENDING_REFRESH_SECONDS", "30")),
+    "community_poll_seconds": int(os.getenv("COMMUNITY_POLL_SECONDS", "5")),
+    "precompute_top_n": int(os.getenv("PRECOMPUTE_TOP_N", "50")),
+    "precompute_top_restaurants": 10,
+    "precompute_workers": int(os.getenv("PRECOMPUTE_WORKERS", str(os.cpu_count() or 2))),
+    "precompute_active_days": int(os.getenv("PRECOMPUTE_ACTIVE_DAYS", "30")),
+    "precompute_max_age_hours": float(os.getenv("PRECOMPUTE_MAX_AGE_HOURS", "24")),
+    "precompute_trending_weight": 0.15,
+    "precompute_liked_bonus": 0.05,
+    "item_neighbors_m": 20,
+    "item_neighbors_refresh_seconds": int(os.getenv("ITEM_NEIGHBORS_REFRESH_SECONDS", "30")),
+    "item_neighbors_cooccur_weight": 0.7,
+    "item_neighbors_max_history": 200,
+    "mf_factors": int(os.getenv("MF_FACTORS", "32")),
+    "mf_iterations": int(os.getenv("MF_ITERATIONS", "10")),
+    "mf_reg": 0.1,
+    "mf_alpha": 10.0,
+    "mf_refresh_seconds": int(os.getenv("MF_REFRESH_SECONDS", "60")),
+    "mf_fold_in_cache_size": 4096,
+    "candidate_pool_workers": int(os.getenv("CANDIDATE_POOL_WORKERS", "16")),
+    # Candidates fetched per source before fusion; only the final k become Food objects
+    "candidate_pool_sizes": {"vector": int(os.getenv("VECTOR_POOL_SIZE", "200")), "collaborative": 100,
+                             "mf": 100, "trending": 50, "community": 20, "liked": 20,
+                             "attributes": 100},
+    "fusion_method": os.getenv("FUSION_METHOD", "rrf"),  # "rrf" or "weighted"
+    "fusion_weights": {"vector": 1.0, "collaborative": 0.8, "mf": 0.8, "trending": 0.5,
+                       "community": 0.3, "liked": 0.3, "attributes": 0.2, "default": 0.2},
+    "rrf_k": 60,
+    # Per-source budgets (seconds) measured from the start of the fan-out
+    "candidate_timeouts": {"vector": 3.0, "collaborative": 0.5, "mf": 0.5, "trending": 0.5,
+                           "community": 0.5, "liked": 0.5, "attributes": 0.5, "default": 1.0},
 }
 
 def ensure_qdrant_collections():
-    existing = [c.name for c in qdrant.get_collections().collections]
-    if "food_collection" not in existing:
-        qdrant.create_collection(
-            collection_name="food_collection",
-            vectors_config=qmodels.VectorParams(size=CONFIG["food_vector_size"], distance=qmodels.Distance.COSINE)
-        )
-    if "user_profiles" not in existing:
-        qdrant.create_collection(
-            collection_name="user_profiles",
-            vectors_config=qmodels.VectorParams(size=CONFIG["user_vector_size"], distance=qmodels.Distance.COSINE)
-        )
-
-ensure_qdrant_collections()
\ No newline at end of file
+    from qdrant_client.http import models as qmodels
+    try:
+        existing = [c.name for c in qdrant.get_collections().collections]
+        if "food_collection" not in existing:
+            qdrant.create_collection(
+                collection_name="food_collection",
+                vectors_config=qmodels.VectorParams(size=CONFIG["food_vector_size"], distance=qmodels.Distance.COSINE)
+            )
+        from vector_store import ensure_food_payload_indexes
+        ensure_food_payload_indexes(qdrant, "food_collection")
+        if "user_profiles" not in existing:
+            qdrant.create_collection(
+                collection_name="user_profiles",
+                vectors_config=qmodels.VectorParams(size=CONFIG["user_vector_size"], distance=qmodels.Distance.COSINE)
+            )
+    except Exception as e:
+        # The local backend can serve food search without Qdrant
+        if VECTOR_BACKEND != "local":
+            raise
+        logger.warning(f"Qdrant provisioning skipped: {e}")
+    if VECTOR_BACKEND == "local":
+        from vector_store import food_vector_backend
+        food_vector_backend()
+
+def warmup():
+    """Explicit startup step: checks Mongo and provisions Qdrant collections. Not run on import."""
+    try:
+        mongo_client.admin.command("ping")
+    except PyMongoError as e:
+        logger.error(f"Mongo connection failed: {e}")
+        raise
+    ensure_qdrant_collections()
@@ -1,17 +1,21 @@
 import datetime
 import logging
-from typing import Dict, Any
+from typing import Dict, Any, Iterator, Tuple
 
 from models import Session, Food
 from recommender import hybrid_food_recommend, get_user
 from kgensam import next_uncertain_attribute
 from util import clean_text
-from config import mongo_db, CONFIG
-from groq_api import groq_chat
+from config import CONFIG, SESSION_BACKEND
+from groq_api import groq_chat, groq_chat_stream
+from session_store import make_session_store
+from restaurants import restaurant_directory
+from community import community_set
+from metrics import timed, stage_timer
 
 logger = logging.getLogger("dialogue")
 
-_session_store: Dict[str, Session] = {}
+_session_store = make_session_store(SESSION_BACKEND, CONFIG["session_ttl_minutes"] * 60)
 
 def get_session(session_id: str, user_id: str) -> Session:
     session = _session_store.get(session_id)
@@ -21,29 +25,27 @@ def get_session(session_id: str, user_id: str) -> Session:
             "asked_attributes": [],
             "pending_question": None # This will track what the bot just asked
         })
-        _session_store[session_id] = session
     session.last_activity = datetime.datetime.utcnow()
     return session
 
+def save_session(session: Session):
+    _session_store.save(session)
+
 def append_dialog(session: Session, role: str, content: str):
     session.dialog_history.append({"role": role, "content": content})
     if len(session.dialog_history) > CONFIG["chat_history_limit"]:
         session.dialog_history = session.dialog_history[-CONFIG["chat_history_limit"]:]
 
 def cleanup_sessions():
-    now = datetime.datetime.utcnow()
-    ttl = datetime.timedelta(minutes=CONFIG["session_ttl_minutes"])
-    to_delete = [sid for sid, ses in _session_store.items() if now - ses.last_activity > ttl]
-    for sid in to_delete:
-        _session_store.pop(sid, None)
+    # Pops only expired entries off the store's expiry heap (no-op for TTL-indexed stores)
+    _session_store.expire()
 
 def _get_restaurant_name(restaurant_id: str) -> str:
     if not restaurant_id:
         return "a local restaurant"
-    doc = mongo_db.restaurants.find_one({"restaurant_id": restaurant_id}, {"restaurant_name": 1})
-    return doc.get("restaurant_name", "a local eatery") if doc else "a local eatery"
+    return restaurant_directory.name(restaurant_id)
 
-def _generate_conversational_recommendation(user_message: str, food: Food, context: Dict[str, Any]) -> str:
+def _recommendation_prompt(user_message: str, food: Food, context: Dict[str, Any]) -> str:
     restaurant_name = _get_restaurant_name(food.restaurant_id)
     reasoning_points = []
     if context.get("trending_area"):
@@ -64,15 +66,50 @@ def _generate_conversational_recommendation(user_message: str, food: Food, conte
     - Reason: {reasoning_str}
     Your task: Craft a warm, conversational response recommending this dish. Weave in the details naturally. Do not just list facts. End by asking for feedback.
     """
-    return groq_chat(prompt.strip())
+    return prompt.strip()
 
 def _is_a_query(text: str) -> bool:
     """Simple heuristic to check if a message is a new query."""
     return any(kw in text for kw in ["recommend", "find", "get me", "suggest", "what about", "how about", "i want"])
 
+@timed("chat")
 def process_message(user_id: str, session_id: str, message: str) -> Dict:
     cleanup_sessions()
     session = get_session(session_id, user_id)
+    try:
+        resp, prompt = _respond(session, user_id, message)
+        if prompt:
+            resp["reply"] = groq_chat(prompt)
+            append_dialog(session, "bot", resp["reply"])
+        return resp
+    finally:
+        save_session(session)
+
+def stream_message(user_id: str, session_id: str, message: str) -> Iterator[Dict]:
+    """Same pipeline as process_message, but relays the LLM reply token by token.
+
+    Yields {"event": "meta", ...} with the recommendation fields first, then
+    {"event": "token", "token": ...} chunks and a final {"event": "done", ...}
+    carrying the full response. Question/fallback turns yield only "done".
+    """
+    cleanup_sessions()
+    session = get_session(session_id, user_id)
+    try:
+        resp, prompt = _respond(session, user_id, message)
+        if prompt:
+            yield {"event": "meta", **resp}
+            parts = []
+            for token in groq_chat_stream(prompt):
+                parts.append(token)
+                yield {"event": "token", "token": token}
+            resp["reply"] = "".join(parts)
+            append_dialog(session, "bot", resp["reply"])
+        yield {"event": "done", **resp}
+    finally:
+        save_session(session)
+
+def _respond(session: Session, user_id: str, message: str) -> Tuple[Dict, str | None]:
+    """Runs the dialogue policy; returns the response and, for recommendations, the LLM prompt to complete it."""
     user = get_user(user_id)
     msg_clean = clean_text(message)
     append_dialog(session, "user", message)
@@ -90,7 +127,8 @@ def process_message(user_id: str, session_id: str, message: str) -> Dict:
     asked_attrs = session.state.get("asked_attributes", [])
     # Check if we still need to ask more questions
     if len(asked_attrs) < CONFIG["max_attribute_questions"]:
-        next_attr = next_uncertain_attribute(user_id, asked_attrs)
+        with stage_timer("chat.kgensam"):
+            next_attr = next_uncertain_attribute(user_id, asked_attrs)
         if next_attr:
             logger.info(f"KGEnSam: Next uncertain attribute is '{next_attr}'. Asking user.")
             # Map attribute to a user-friendly question
@@ -103,7 +141,7 @@ def process_message(user_id: str, session_id: str, message: str) -> Dict:
             question_to_ask = question_map.get(next_attr, f"What about {next_attr.replace('_', ' ')}?")
             session.state["pending_question"] = next_attr # Set the pending question
             append_dialog(session, "bot", question_to_ask)
-            return {"reply": question_to_ask}
+            return {"reply": question_to_ask}, None
 
     # --- Step 3: If no more questions, proceed to recommendation ---
     logger.info("Proceeding to recommendation. All required attributes gathered or limit reached.")
@@ -115,22 +153,21 @@ def process_message(user_id: str, session_id: str, message: str) -> Dict:
         context_flags = {
             "trending_area": filters.get("area"),
             "collaborative": bool(user.liked_foods),
-            "community": mongo_db.community_suggestions.count_documents({"status": "approved"}) > 0
+            "community": community_set.count() > 0
         }
-        conversational_reply = _generate_conversational_recommendation(message, top_food, context_flags)
+        prompt = _recommendation_prompt(message, top_food, context_flags)
         session.state["last_food_id"] = top_food.food_id
         session.state["last_restaurant_id"] = top_food.restaurant_id
         session.state["pending_question"] = None # Ensure no question is pending
 
-        append_dialog(session, "bot", conversational_reply)
+        # The reply is generated (or streamed) by the caller from the prompt
         return {
-            "reply": conversational_reply,
             "recommended_food": top_food.food_name,
             "food_id": top_food.food_id,
             "restaurant_id": top_food.restaurant_id,
             "request_feedback": True
-        }
+        }, prompt
     else:
         fallback_reply = "I'm sorry, I couldn't find a perfect match with those preferences. Shall we try adjusting something, perhaps the cuisine or area?"
         append_dialog(session, "bot", fallback_reply)
-        return {"reply": fallback_reply}
\ No newline at end of file
+        return {"reply": fallback_reply}, None
\ No newline at end of file
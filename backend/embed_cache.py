@@ -0,0 +1,101 @@
+import os
+import hashlib
+import logging
+import sqlite3
+import threading
+import numpy as np
+from collections import OrderedDict
+from typing import Dict, Optional
+
+logger = logging.getLogger("embed_cache")
+
+def normalize_text(text: str) -> str:
+    return " ".join(text.split()).lower()
+
+class EmbeddingCache:
+    """LRU embedding cache keyed by (model, normalized text hash) with an optional SQLite tier.
+
+    The SQLite file is opened per process (WAL mode), so gunicorn workers and the
+    ETL share warm embeddings across restarts.
+    """
+
+    def __init__(self, max_entries: int = 4096, path: str | None = None, max_disk_entries: int = 200000):
+        self.max_entries = max_entries
+        self.max_disk_entries = max_disk_entries
+        self.path = path or None
+        self._mem: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self._db_pid = None
+        self._puts = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(model: str, text: str) -> str:
+        digest = hashlib.sha1(normalize_text(text).encode("utf-8")).hexdigest()
+        return f"{model}:{digest}"
+
+    def _conn(self):
+        if not self.path:
+            return None
+        if self._db is None or self._db_pid != os.getpid():
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            db = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+            self._db, self._db_pid = db, os.getpid()
+        return self._db
+
+    def _remember(self, key: str, vec: np.ndarray):
+        self._mem[key] = vec
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.max_entries:
+            self._mem.popitem(last=False)
+
+    def get(self, model: str, text: str) -> Optional[np.ndarray]:
+        key = self.key(model, text)
+        with self._lock:
+            vec = self._mem.get(key)
+            if vec is not None:
+                self._mem.move_to_end(key)
+                self.hits += 1
+                return vec
+            try:
+                db = self._conn()
+                row = db.execute("SELECT vector FROM embeddings WHERE key=?", (key,)).fetchone() if db else None
+            except sqlite3.Error as e:
+                logger.warning(f"Embedding cache read failed: {e}")
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            vec = np.frombuffer(row[0], dtype=np.float32)
+            self._remember(key, vec)
+            self.disk_hits += 1
+            return vec
+
+    def put(self, model: str, text: str, embedding) -> np.ndarray:
+        vec = np.array(embedding, dtype=np.float32)
+        vec.setflags(write=False)
+        key = self.key(model, text)
+        with self._lock:
+            self._remember(key, vec)
+            try:
+                db = self._conn()
+                if db:
+                    db.execute("INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)", (key, vec.tobytes()))
+                    self._puts += 1
+                    if self._puts % 256 == 0:
+                        db.execute("DELETE FROM embeddings WHERE rowid IN "
+                                   "(SELECT rowid FROM embeddings ORDER BY rowid DESC LIMIT -1 OFFSET ?)",
+                                   (self.max_disk_entries,))
+                    db.commit()
+            except sqlite3.Error as e:
+                logger.warning(f"Embedding cache write failed: {e}")
+        return vec
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries": len(self._mem), "max_entries": self.max_entries, "hits": self.hits,
+                "disk_hits": self.disk_hits, "misses": self.misses}
@@ -1,88 +1,154 @@
-import datetime
-from typing import List
+import re
+from collections import defaultdict
+from typing import Any, Dict, List
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
 from models import Feedback
-from config import mongo_db, neo4j_driver, qdrant
-from util import embed_text_gemini
-from recommender import get_user
+from config import mongo_db, neo4j_driver, CONFIG, FEEDBACK_WRITE_BEHIND
+from kgensam import record_like
+from feedback_queue import WriteBehindQueue, StepLog
+from user_vectors import apply_feedback_vectors
+from trending import trending_boards
+from precompute import mark_dirty
+from item_neighbors import item_neighbors
+from metrics import timed, Gauge
 import logging
 
 logger = logging.getLogger("feedback")
 
+_REL_TYPE = re.compile(r"^[A-Z_]+$")
+
+@timed("feedback.log")
 def log_feedback(feedback: Feedback):
-    mongo_db.interactions.insert_one(feedback.to_dict())
-
-    if feedback.food_id:
-        delta = 1 if feedback.action == "like" else -1
-        mongo_db.food_popularity.update_one({"food_id": feedback.food_id},
-                                            {"$inc": {"score": delta}}, upsert=True)
-        field = "liked_foods" if feedback.action == "like" else "disliked_foods"
-        mongo_db.users.update_one({"user_id": feedback.user_id},
-                                  {"$addToSet": {field: feedback.food_id}})
-
-    if feedback.restaurant_id:
-        delta = 1 if feedback.action == "like" else -1
-        mongo_db.restaurants.update_one({"restaurant_id": feedback.restaurant_id},
-                                        {"$inc": {"score": delta}}, upsert=True)
-
-    _update_graph(feedback)
-    _update_user_vector(feedback.user_id)
-
-def _update_graph(feedback: Feedback):
-    statements = []
-    if feedback.food_id:
-        statements.append((
-            """
-            MERGE (u:User {user_id:$uid})
-            MERGE (f:Food {food_id:$fid})
-            MERGE (u)-[r:%s]->(f)
-            SET r.timestamp=$ts, r.comment=$comment
-            """ % feedback.action.upper(),
-            {"uid": feedback.user_id, "fid": feedback.food_id,
-             "ts": feedback.timestamp.isoformat(), "comment": feedback.comment or ""}
-        ))
-    if feedback.restaurant_id:
-        statements.append((
-            """
-            MERGE (u:User {user_id:$uid})
-            MERGE (r:Restaurant {restaurant_id:$rid})
-            MERGE (u)-[x:%s]->(r)
-            SET x.timestamp=$ts, x.comment=$comment
-            """ % feedback.action.upper(),
-            {"uid": feedback.user_id, "rid": feedback.restaurant_id,
-             "ts": feedback.timestamp.isoformat(), "comment": feedback.comment or ""}
-        ))
-    with neo4j_driver.session() as session:
-        for q, p in statements:
-            try:
-                session.run(q, **p)
-            except Exception as e:
-                logger.warning(f"Neo4j write failed: {e}")
-
-def _update_user_vector(user_id: str):
-    user = get_user(user_id)
-    texts: List[str] = []
-    for fid in getattr(user, "liked_foods", []):
-        fdoc = mongo_db.foods.find_one({"food_id": fid}, {"description": 1, "food_name": 1})
-        if fdoc:
-            desc = fdoc.get("description") or fdoc.get("food_name", "")
-            texts.append(desc)
-    for fid in getattr(user, "disliked_foods", []):
-        fdoc = mongo_db.foods.find_one({"food_id": fid}, {"description": 1, "food_name": 1})
-        if fdoc:
-            desc = fdoc.get("description") or fdoc.get("food_name", "")
-            texts.append("NOT " + desc)
-    corpus = " ".join(texts).strip()
-    if not corpus:
+    """Acknowledges once the event is durably enqueued; writes are applied in batches off-thread."""
+    if not FEEDBACK_WRITE_BEHIND:
+        apply_feedback_batch([feedback.to_dict()])
+        return
+    _feedback_queue.enqueue(feedback.to_dict())
+
+@timed("feedback.apply_batch")
+def apply_feedback_batch(events: List[Dict[str, Any]], steps: StepLog | None = None):
+    """Coalesces a batch of feedback events into bulk Mongo writes, UNWIND graph writes and vector work.
+
+    Counter and vector updates run through `steps`, so a re-applied batch skips the events
+    they already covered; the remaining writes are idempotent.
+    """
+    if not events:
+        return
+    steps = steps or StepLog()
+    _insert_interactions(events)
+    steps.run("popularity", events, _apply_popularity)
+    # Co-occurrence is counted against the likes stored before this batch
+    steps.run("cooccurrence", events, lambda batch: item_neighbors.record_likes(_foods_by_user(batch, liked=True)))
+    user_sets: Dict[str, Dict[str, List[str]]] = defaultdict(dict)
+    for field, liked in (("liked_foods", True), ("disliked_foods", False)):
+        for uid, ids in _foods_by_user(events, liked).items():
+            user_sets[uid][field] = ids
+    if user_sets:
+        mongo_db.users.bulk_write([UpdateOne({"user_id": uid},
+                                             {"$addToSet": {f: {"$each": ids} for f, ids in fields.items()}})
+                                   for uid, fields in user_sets.items()], ordered=False)
+    steps.run("restaurants", events, _apply_restaurant_scores)
+
+    for uid, fids in _foods_by_user(events, liked=True).items():
+        for fid in fids:
+            record_like(uid, fid)
+
+    steps.run("trending", events, trending_boards.record)
+    mark_dirty([e["user_id"] for e in events if e.get("food_id")])
+    _update_graph(events)
+    steps.run("user_vectors", events, apply_feedback_vectors)
+
+def _insert_interactions(events: List[Dict[str, Any]]):
+    # Queued events carry their outbox id as _id, so a re-applied batch hits duplicate keys only
+    try:
+        mongo_db.interactions.insert_many([dict(e) for e in events], ordered=False)
+    except BulkWriteError as e:
+        if any(err.get("code") != 11000 for err in e.details.get("writeErrors", [])):
+            raise
+
+def _delta(e: Dict[str, Any]) -> int:
+    return 1 if e.get("action") == "like" else -1
+
+def _foods_by_user(events: List[Dict[str, Any]], liked: bool) -> Dict[str, List[str]]:
+    out: Dict[str, List[str]] = defaultdict(list)
+    for e in events:
+        if e.get("food_id") and (e.get("action") == "like") == liked:
+            out[e["user_id"]].append(e["food_id"])
+    return {uid: list(dict.fromkeys(ids)) for uid, ids in out.items()}
+
+def _apply_popularity(events: List[Dict[str, Any]]):
+    food_delta: Dict[str, int] = defaultdict(int)
+    for e in events:
+        if e.get("food_id"):
+            food_delta[e["food_id"]] += _delta(e)
+    if food_delta:
+        mongo_db.food_popularity.bulk_write([UpdateOne({"food_id": fid}, {"$inc": {"score": d}}, upsert=True)
+                                             for fid, d in food_delta.items()], ordered=False)
+
+def _apply_restaurant_scores(events: List[Dict[str, Any]]):
+    rest_delta: Dict[str, int] = defaultdict(int)
+    for e in events:
+        if e.get("restaurant_id"):
+            rest_delta[e["restaurant_id"]] += _delta(e)
+    if rest_delta:
+        mongo_db.restaurants.bulk_write([UpdateOne({"restaurant_id": rid}, {"$inc": {"score": d}}, upsert=True)
+                                         for rid, d in rest_delta.items()], ordered=False)
+
+def _update_graph(events: List[Dict[str, Any]]):
+    food_rows: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+    rest_rows: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+    for e in events:
+        rel = str(e.get("action", "")).upper()
+        if not _REL_TYPE.match(rel):
+            logger.warning(f"Skipping graph write for unsupported action '{e.get('action')}'")
+            continue
+        row = {"uid": e["user_id"], "ts": e.get("timestamp"), "comment": e.get("comment") or ""}
+        if e.get("food_id"):
+            food_rows[rel].append({**row, "fid": e["food_id"]})
+        if e.get("restaurant_id"):
+            rest_rows[rel].append({**row, "rid": e["restaurant_id"]})
+    if not food_rows and not rest_rows:
         return
-    vec = embed_text_gemini(corpus).tolist()
+
+    # Relationship types can't be parameterized, so one UNWIND statement per action
+    def write(tx):
+        for rel, rows in food_rows.items():
+            tx.run("""
+                UNWIND $rows AS row
+                MERGE (u:User {user_id: row.uid})
+                MERGE (f:Food {food_id: row.fid})
+                MERGE (u)-[r:%s]->(f)
+                SET r.timestamp = row.ts, r.comment = row.comment
+            """ % rel, rows=rows).consume()
+        for rel, rows in rest_rows.items():
+            tx.run("""
+                UNWIND $rows AS row
+                MERGE (u:User {user_id: row.uid})
+                MERGE (r:Restaurant {restaurant_id: row.rid})
+                MERGE (u)-[x:%s]->(r)
+                SET x.timestamp = row.ts, x.comment = row.comment
+            """ % rel, rows=rows).consume()
+
     try:
-        qdrant.upsert(collection_name="user_profiles",
-                      points=[{"id": user_id,
-                               "vector": vec,
-                               "payload": {"user_id": user_id,
-                                           "updated_at": datetime.datetime.utcnow().isoformat()}}])
+        with neo4j_driver.session() as session:
+            session.execute_write(write)
     except Exception as e:
-        logger.warning(f"Qdrant user vector upsert failed: {e}")
+        logger.warning(f"Neo4j write failed: {e}")
+
+_feedback_queue = WriteBehindQueue(
+    mongo_db.feedback_outbox, apply_feedback_batch,
+    max_depth=CONFIG["feedback_queue_depth"], batch_size=CONFIG["feedback_batch_size"],
+    linger_seconds=CONFIG["feedback_linger_seconds"], enqueue_timeout=CONFIG["feedback_enqueue_timeout"])
+_feedback_queue.register_shutdown_hook()
+
+def flush_feedback(timeout: float = 10.0) -> bool:
+    return _feedback_queue.flush(timeout)
+
+def feedback_queue_depth() -> int:
+    return _feedback_queue.depth()
+
+Gauge("foodrec_feedback_queue_depth", "Feedback events waiting to be applied.", feedback_queue_depth)
 
 def get_feedback_stats():
     likes = mongo_db.interactions.count_documents({"action": "like"})
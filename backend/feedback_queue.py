@@ -0,0 +1,172 @@
+import os
+import time
+import uuid
+import queue
+import atexit
+import logging
+import datetime
+import threading
+from typing import Any, Callable, Dict, List
+
+logger = logging.getLogger("feedback_queue")
+
+class FeedbackBackpressure(Exception):
+    """Raised when the write-behind queue is full; the API should ask the client to retry."""
+
+class StepLog:
+    """Records, per outbox event, which non-idempotent steps of apply_batch have run.
+
+    A batch can be applied more than once (retries, stale recovery). Each $inc-style step goes
+    through run(), which skips the events already marked for that step and marks the rest after
+    the step succeeds. Without an outbox (direct writes) every step simply runs.
+    """
+
+    def __init__(self, outbox=None, ids: List[Any] = ()):
+        self._outbox = outbox
+        self._applied: Dict[Any, set] = {}
+        if outbox is not None and ids:
+            self._applied = {d["_id"]: set(d.get("applied", []))
+                             for d in outbox.find({"_id": {"$in": list(ids)}}, {"applied": 1})}
+
+    def run(self, step: str, events: List[Dict[str, Any]], fn: Callable[[List[Dict[str, Any]]], None]):
+        if self._outbox is None:
+            fn(events)
+            return
+        todo = [e for e in events if step not in self._applied.get(e.get("_id"), ())]
+        if not todo:
+            return
+        fn(todo)
+        ids = [e["_id"] for e in todo if "_id" in e]
+        self._outbox.update_many({"_id": {"$in": ids}}, {"$addToSet": {"applied": step}})
+        for i in ids:
+            self._applied.setdefault(i, set()).add(step)
+
+class WriteBehindQueue:
+    """Durable-enqueue, batch-apply queue for feedback events.
+
+    enqueue() persists the event in an outbox collection before handing it to a
+    bounded in-memory queue. A background thread drains the queue in batches,
+    calls apply_batch, then deletes the applied outbox docs. Docs left behind by a
+    crashed worker are re-claimed after stale_seconds.
+
+    apply_batch gets each event with the outbox id as "_id" and a StepLog, so a batch
+    that is re-applied does not repeat the steps that already went through.
+    """
+
+    def __init__(self, outbox, apply_batch: Callable[[List[Dict[str, Any]], StepLog], None], max_depth: int = 10000,
+                 batch_size: int = 200, linger_seconds: float = 0.5, enqueue_timeout: float = 0.5,
+                 stale_seconds: int = 600, retries: int = 3):
+        self._outbox = outbox
+        self._apply_batch = apply_batch
+        self._queue: "queue.Queue[Dict[str, Any]]" = queue.Queue(maxsize=max_depth)
+        self.batch_size = batch_size
+        self.linger_seconds = linger_seconds
+        self.enqueue_timeout = enqueue_timeout
+        self.stale_seconds = stale_seconds
+        self.retries = retries
+        self._worker_id = uuid.uuid4().hex
+        self._thread: threading.Thread | None = None
+        self._pid = None
+        self._stop = threading.Event()
+        self._start_lock = threading.Lock()
+        self._last_recover = 0.0
+        self.applied = 0
+        self.failed_batches = 0
+
+    def _ensure_started(self):
+        # Started lazily (and again after a fork) so only serving processes run a consumer
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._stop.clear()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="feedback-writer", daemon=True)
+            self._thread.start()
+
+    def enqueue(self, event: Dict[str, Any]):
+        self._ensure_started()
+        doc = {"event": event, "worker": self._worker_id, "enqueued_at": datetime.datetime.utcnow()}
+        self._outbox.insert_one(doc)
+        try:
+            self._queue.put(doc, timeout=self.enqueue_timeout)
+        except queue.Full:
+            self._outbox.delete_one({"_id": doc["_id"]})
+            raise FeedbackBackpressure("Feedback queue is full")
+
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    def _drain(self) -> List[Dict[str, Any]]:
+        try:
+            batch = [self._queue.get(timeout=self.linger_seconds)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.linger_seconds
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=max(remaining, 0)) if remaining > 0
+                             else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _process(self, batch: List[Dict[str, Any]]):
+        events = [dict(d["event"], _id=d["_id"]) for d in batch]
+        for attempt in range(1, self.retries + 1):
+            try:
+                self._apply_batch(events, StepLog(self._outbox, [d["_id"] for d in batch]))
+                self._outbox.delete_many({"_id": {"$in": [d["_id"] for d in batch]}})
+                self.applied += len(batch)
+                return
+            except Exception as e:
+                logger.warning(f"Feedback batch of {len(batch)} failed (attempt {attempt}): {e}")
+                time.sleep(0.2 * 2 ** (attempt - 1))
+        # Left in the outbox; picked up again by _recover_stale
+        self.failed_batches += 1
+
+    def _recover_stale(self):
+        cutoff = datetime.datetime.utcnow() - datetime.timedelta(seconds=self.stale_seconds)
+        now = datetime.datetime.utcnow()
+        self._outbox.update_many({"enqueued_at": {"$lt": cutoff}},
+                                 {"$set": {"worker": self._worker_id, "enqueued_at": now, "recovered": True}})
+        stale = list(self._outbox.find({"worker": self._worker_id, "recovered": True}))
+        if stale:
+            logger.info(f"Re-applying {len(stale)} stale feedback events")
+            for start in range(0, len(stale), self.batch_size):
+                self._process(stale[start:start + self.batch_size])
+
+    def _run(self):
+        while True:
+            batch = self._drain()
+            if batch:
+                self._process(batch)
+                for _ in batch:
+                    self._queue.task_done()
+            if time.monotonic() - self._last_recover > self.stale_seconds:
+                self._last_recover = time.monotonic()
+                try:
+                    self._recover_stale()
+                except Exception as e:
+                    logger.warning(f"Feedback outbox recovery failed: {e}")
+            if self._stop.is_set() and self._queue.empty():
+                break
+
+    def flush(self, timeout: float = 10.0) -> bool:
+        """Blocks until everything enqueued so far is applied (or timeout)."""
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.05)
+        return not self._queue.unfinished_tasks
+
+    def shutdown(self, timeout: float = 10.0):
+        if self._thread is None or self._pid != os.getpid():
+            return
+        self.flush(timeout)
+        self._stop.set()
+        self._thread.join(timeout)
+
+    def register_shutdown_hook(self):
+        atexit.register(self.shutdown)
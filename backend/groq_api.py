@@ -1,13 +1,32 @@
 import os
+import json
 import logging
 import requests
-from typing import List, Dict
+from requests.adapters import HTTPAdapter
+from typing import List, Dict, Iterator
+from llm_cache import LLMCache
+from metrics import timed, stage_timer, llm_requests_total
 
 logger = logging.getLogger("groq_api")
 
 GROQ_URL = os.getenv("GROQ_URL")
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 DEFAULT_MODEL = "meta-llama/llama-4-scout-17b-16e-instruct" # Using a fast and capable model
+GROQ_POOL_SIZE = int(os.getenv("GROQ_POOL_SIZE", "16"))
+GROQ_TIMEOUT = (5, 20)  # (connect, read) seconds
+MAX_TOKENS = 250
+
+UNAVAILABLE_REPLY = "LLM is currently unavailable (missing API credentials)."
+TIMEOUT_REPLY = "Sorry, the recommendation is taking too long to generate. Please try again."
+ERROR_REPLY = "My thinking cap isn't working right now! I can't generate a conversational response."
+
+# One keep-alive connection pool shared by every request thread, so turns skip TCP/TLS setup
+_http = requests.Session()
+_http.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=GROQ_POOL_SIZE))
+_http.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=GROQ_POOL_SIZE))
+
+llm_cache = LLMCache(max_entries=int(os.getenv("LLM_CACHE_SIZE", "2048")),
+                     ttl_seconds=int(os.getenv("LLM_CACHE_TTL_SECONDS", "3600")))
 
 # --- System Persona ---
 SYSTEM_PROMPT = {
@@ -20,13 +39,7 @@ SYSTEM_PROMPT = {
     )
 }
 
-def groq_chat(prompt: str, history: List[Dict[str, str]] | None = None, temperature: float = 0.7) -> str:
-    """
-    Generic Groq chat wrapper with a system persona for conversational responses.
-    """
-    if not GROQ_URL or not GROQ_API_KEY:
-        return "LLM is currently unavailable (missing API credentials)."
-
+def _build_messages(prompt: str, history: List[Dict[str, str]] | None) -> List[Dict[str, str]]:
     messages = [SYSTEM_PROMPT]
     if history:
         # Add only the last few turns of history to keep context
@@ -39,32 +52,114 @@ def groq_chat(prompt: str, history: List[Dict[str, str]] | None = None, temperat
                 messages.append({"role": "assistant", "content": content})
 
     messages.append({"role": "user", "content": prompt})
+    return messages
+
+def _post(payload: Dict, stream: bool = False) -> requests.Response:
+    resp = _http.post(
+        GROQ_URL,
+        headers={
+            "Authorization": f"Bearer {GROQ_API_KEY}",
+            "Content-Type": "application/json"
+        },
+        json=payload,
+        timeout=GROQ_TIMEOUT,
+        stream=stream
+    )
+    resp.raise_for_status()
+    return resp
+
+@timed("llm")
+def groq_chat(prompt: str, history: List[Dict[str, str]] | None = None, temperature: float = 0.7) -> str:
+    """
+    Generic Groq chat wrapper with a system persona for conversational responses.
+    Identical prompts are served from llm_cache, and concurrent ones share a single call.
+    """
+    if not GROQ_URL or not GROQ_API_KEY:
+        llm_requests_total.inc(outcome="unavailable")
+        return UNAVAILABLE_REPLY
 
+    messages = _build_messages(prompt, history)
     payload = {
         "model": DEFAULT_MODEL,
         "messages": messages,
         "temperature": temperature,
-        "max_tokens": 250,
+        "max_tokens": MAX_TOKENS,
     }
+    key = LLMCache.key(DEFAULT_MODEL, temperature, messages, max_tokens=MAX_TOKENS)
 
     try:
-        resp = requests.post(
-            GROQ_URL,
-            headers={
-                "Authorization": f"Bearer {GROQ_API_KEY}",
-                "Content-Type": "application/json"
-            },
-            json=payload,
-            timeout=20 # Increased timeout for generation
-        )
-        resp.raise_for_status()
-        data = resp.json()
-        choice = data.get("choices", [{}])[0]
-        msg = choice.get("message", {}).get("content", "")
+        msg = llm_cache.get_or_compute(key, lambda: _complete(payload))
+        llm_requests_total.inc(outcome="ok")
         return msg or "Sorry, I couldn't generate a proper response."
     except requests.exceptions.Timeout:
         logger.warning("Groq API timed out.")
-        return "Sorry, the recommendation is taking too long to generate. Please try again."
+        llm_requests_total.inc(outcome="timeout")
+        return TIMEOUT_REPLY
     except Exception as e:
         logger.warning(f"Groq API call failed: {e}")
-        return "My thinking cap isn't working right now! I can't generate a conversational response."
\ No newline at end of file
+        llm_requests_total.inc(outcome="error")
+        return ERROR_REPLY
+
+def _complete(payload: Dict) -> str:
+    # Only cache misses reach here, so this stage counts real upstream calls
+    with stage_timer("llm.request"):
+        data = _post(payload).json()
+    choice = data.get("choices", [{}])[0]
+    return choice.get("message", {}).get("content", "")
+
+def groq_chat_stream(prompt: str, history: List[Dict[str, str]] | None = None,
+                     temperature: float = 0.7) -> Iterator[str]:
+    """
+    Streaming variant of groq_chat: yields completion tokens as the server-sent events arrive.
+    A cached reply is yielded as a single chunk; a completed stream is added to the cache.
+    """
+    if not GROQ_URL or not GROQ_API_KEY:
+        llm_requests_total.inc(outcome="unavailable")
+        yield UNAVAILABLE_REPLY
+        return
+
+    messages = _build_messages(prompt, history)
+    key = LLMCache.key(DEFAULT_MODEL, temperature, messages, max_tokens=MAX_TOKENS)
+    cached = llm_cache.get(key)
+    if cached:
+        llm_requests_total.inc(outcome="ok")
+        yield cached
+        return
+
+    payload = {
+        "model": DEFAULT_MODEL,
+        "messages": messages,
+        "temperature": temperature,
+        "max_tokens": MAX_TOKENS,
+        "stream": True,
+    }
+
+    produced = False
+    parts = []
+    try:
+        with _post(payload, stream=True) as resp:
+            for line in resp.iter_lines(decode_unicode=True):
+                if not line or not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    if parts:
+                        llm_cache.put(key, "".join(parts))
+                    break
+                delta = json.loads(data).get("choices", [{}])[0].get("delta", {})
+                token = delta.get("content")
+                if token:
+                    produced = True
+                    parts.append(token)
+                    yield token
+        llm_requests_total.inc(outcome="ok")
+    except requests.exceptions.Timeout:
+        logger.warning("Groq API stream timed out.")
+        llm_requests_total.inc(outcome="timeout")
+        if not produced:
+            yield TIMEOUT_REPLY
+    except Exception as e:
+        logger.warning(f"Groq API stream failed: {e}")
+        llm_requests_total.inc(outcome="error")
+        if not produced:
+            yield ERROR_REPLY
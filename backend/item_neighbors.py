@@ -0,0 +1,273 @@
+import os
+import time
+import logging
+import datetime
+import threading
+import numpy as np
+from collections import defaultdict
+from typing import Dict, Iterable, List, Tuple
+from pymongo import UpdateOne
+from config import mongo_db, CONFIG, ITEM_NEIGHBORS_PATH
+from vector_store import food_matrix
+
+logger = logging.getLogger("item_neighbors")
+
+# Two top-M neighbor tables over the same food rows, stored as (n, M) arrays padded with -1:
+#   emb_*: cosine neighbors from food_collection embeddings (rebuilt offline)
+#   co_*:  like co-occurrence, n_ab / sqrt(likes_a * likes_b), kept current from
+#          mongo_db.item_cooccurrence docs {food_id, likes, counts: {other_id: n}, updated_at}
+
+def embedding_neighbors(matrix: np.ndarray, m: int, block: int = 1024,
+                        rows: np.ndarray | None = None) -> Tuple[np.ndarray, np.ndarray]:
+    """Top-m cosine neighbors of every row (or of `rows` only), one (block x n) matrix product at a time."""
+    n = len(matrix)
+    rows = np.arange(n) if rows is None else np.asarray(rows, dtype=np.int64)
+    m = min(m, max(n - 1, 0))
+    idx = np.full((len(rows), m), -1, dtype=np.int32)
+    scores = np.zeros((len(rows), m), dtype=np.float32)
+    if m == 0:
+        return idx, scores
+    for start in range(0, len(rows), block):
+        query_rows = rows[start:start + block]
+        sims = matrix[query_rows] @ matrix.T
+        sims[np.arange(len(sims)), query_rows] = -np.inf
+        top = np.argpartition(-sims, m - 1, axis=1)[:, :m]
+        top_scores = np.take_along_axis(sims, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        idx[start:start + block] = np.take_along_axis(top, order, axis=1)
+        scores[start:start + block] = np.take_along_axis(top_scores, order, axis=1)
+    return idx, scores
+
+def food_neighbors(matrix: np.ndarray, row_food_ids: List[str], m: int) -> Tuple[List[str], np.ndarray, np.ndarray]:
+    """Embedding neighbors keyed by food_id over per-row vectors.
+
+    A food_id stored on several rows (raw food.csv repeats ids across dishes) is represented by its
+    first row, as vector_store.get_vectors resolves it, so one id's neighbors never mix dishes.
+    Neighbor rows are mapped to their food ids, dropping the id itself and repeats.
+    """
+    first: Dict[str, int] = {}
+    for i, fid in enumerate(row_food_ids):
+        first.setdefault(fid, i)
+    food_ids = list(first)
+    code_of = {fid: i for i, fid in enumerate(food_ids)}
+    codes = np.array([code_of[fid] for fid in row_food_ids], dtype=np.int32)
+    extra = len(row_food_ids) - len(food_ids)
+    if not extra:
+        idx, scores = embedding_neighbors(matrix, m)
+        return food_ids, np.pad(idx, ((0, 0), (0, m - idx.shape[1])), constant_values=-1), \
+            np.pad(scores, ((0, 0), (0, m - scores.shape[1])))
+    row_idx, row_scores = embedding_neighbors(matrix, m + min(extra, 3 * m), rows=np.array(list(first.values())))
+    idx = np.full((len(food_ids), m), -1, dtype=np.int32)
+    scores = np.zeros((len(food_ids), m), dtype=np.float32)
+    for i in range(len(food_ids)):
+        found = 0
+        seen = {i}
+        for r, score in zip(row_idx[i], row_scores[i]):
+            if r < 0 or found == m:
+                break
+            code = codes[r]
+            if code in seen:
+                continue
+            seen.add(code)
+            idx[i, found], scores[i, found] = code, score
+            found += 1
+    return food_ids, idx, scores
+
+class ItemNeighbors:
+    def __init__(self, path: str, m: int, refresh_seconds: int, collection):
+        self.path = path
+        self.m = m
+        self.refresh_seconds = refresh_seconds
+        self._col = collection
+        self._lock = threading.Lock()
+        self._food_ids: List[str] = []
+        self._row_of: Dict[str, int] = {}
+        self._emb_idx = np.full((0, m), -1, dtype=np.int32)
+        self._emb_scores = np.zeros((0, m), dtype=np.float32)
+        self._co_idx = np.full((0, m), -1, dtype=np.int32)
+        self._co_scores = np.zeros((0, m), dtype=np.float32)
+        self._likes: Dict[str, int] = {}
+        self._loaded = False
+        self._synced_at = datetime.datetime.min
+        self._checked_at = 0.0
+
+    # --- Building ---
+    def _rows_for(self, food_ids: Iterable[str]) -> None:
+        """Appends rows for unseen foods (new foods only get co-occurrence neighbors)."""
+        new = [fid for fid in dict.fromkeys(food_ids) if fid not in self._row_of]
+        if not new:
+            return
+        for fid in new:
+            self._row_of[fid] = len(self._food_ids)
+            self._food_ids.append(fid)
+        pad_idx = np.full((len(new), self.m), -1, dtype=np.int32)
+        pad_scores = np.zeros((len(new), self.m), dtype=np.float32)
+        self._emb_idx = np.vstack([self._emb_idx, pad_idx])
+        self._emb_scores = np.vstack([self._emb_scores, pad_scores])
+        self._co_idx = np.vstack([self._co_idx, pad_idx])
+        self._co_scores = np.vstack([self._co_scores, pad_scores])
+
+    def _apply_cooccurrence(self, docs: List[Dict]):
+        for doc in docs:
+            self._likes[doc["food_id"]] = max(int(doc.get("likes", 0)), 0)
+        self._rows_for(fid for doc in docs for fid in [doc["food_id"], *doc.get("counts", {})])
+        for doc in docs:
+            counts = doc.get("counts") or {}
+            if not counts:
+                continue
+            others = list(counts)
+            n_ab = np.array([counts[o] for o in others], dtype=np.float32)
+            denom = np.sqrt(max(self._likes.get(doc["food_id"], 0), 1) *
+                            np.array([max(self._likes.get(o, 0), 1) for o in others], dtype=np.float32))
+            sims = n_ab / denom
+            keep = np.argsort(-sims)[:self.m]
+            row = self._row_of[doc["food_id"]]
+            self._co_idx[row] = -1
+            self._co_scores[row] = 0.0
+            self._co_idx[row, :len(keep)] = [self._row_of[others[i]] for i in keep]
+            self._co_scores[row, :len(keep)] = sims[keep]
+
+    def rebuild(self) -> int:
+        """Full rebuild of both tables; saves the compact arrays to `path`."""
+        matrix, payloads = food_matrix()
+        food_ids, emb_idx, emb_scores = food_neighbors(matrix, [str(p.get("food_id")) for p in payloads], self.m)
+        started = datetime.datetime.utcnow()
+        docs = list(self._col.find({}, {"_id": 0}))
+        with self._lock:
+            self._food_ids, self._row_of = food_ids, {fid: i for i, fid in enumerate(food_ids)}
+            self._emb_idx, self._emb_scores = emb_idx, emb_scores
+            self._co_idx = np.full_like(emb_idx, -1)
+            self._co_scores = np.zeros_like(emb_scores)
+            self._likes = {}
+            self._apply_cooccurrence(docs)
+            self._synced_at = started
+            self._loaded = True
+            self._save()
+        logger.info(f"Item neighbors rebuilt: {len(self._food_ids)} foods, {len(docs)} with co-likes")
+        return len(self._food_ids)
+
+    def rebuild_cooccurrence(self, history: int | None = None) -> int:
+        """Recounts item_cooccurrence from every user's liked_foods, then rebuilds the tables."""
+        history = history or CONFIG["item_neighbors_max_history"]
+        likes: Dict[str, int] = defaultdict(int)
+        counts: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        for doc in mongo_db.users.find({"liked_foods.0": {"$exists": True}}, {"liked_foods": 1}):
+            liked = list(dict.fromkeys(doc["liked_foods"]))[-history:]
+            for i, a in enumerate(liked):
+                likes[a] += 1
+                for b in liked[i + 1:]:
+                    counts[a][b] += 1
+                    counts[b][a] += 1
+        now = datetime.datetime.utcnow()
+        self._col.drop()
+        self._col.create_index("food_id", unique=True)
+        self._col.create_index("updated_at")
+        docs = [{"food_id": fid, "likes": n, "counts": dict(counts.get(fid, {})), "updated_at": now}
+                for fid, n in likes.items()]
+        for start in range(0, len(docs), 1000):
+            self._col.insert_many(docs[start:start + 1000])
+        return self.rebuild()
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = self.path + ".tmp.npz"
+        np.savez(tmp, food_ids=np.array(self._food_ids), emb_idx=self._emb_idx, emb_scores=self._emb_scores)
+        os.replace(tmp, self.path)
+
+    # --- Loading / incremental sync ---
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            if os.path.exists(self.path):
+                data = np.load(self.path)
+                self._food_ids = [str(f) for f in data["food_ids"]]
+                self._row_of = {fid: i for i, fid in enumerate(self._food_ids)}
+                self._emb_idx, self._emb_scores = data["emb_idx"], data["emb_scores"]
+                self._co_idx = np.full_like(self._emb_idx, -1)
+                self._co_scores = np.zeros_like(self._emb_scores)
+            else:
+                logger.warning(f"No item neighbor table at {self.path}; run 'scripts/maintenance.py item-neighbors'")
+            self._loaded = True
+
+    def _sync(self, force: bool = False):
+        """Recomputes co-occurrence rows for items whose counts changed since the last sync."""
+        if not force and time.monotonic() - self._checked_at < self.refresh_seconds:
+            return
+        self._checked_at = time.monotonic()
+        since = self._synced_at
+        started = datetime.datetime.utcnow()
+        try:
+            docs = list(self._col.find({"updated_at": {"$gte": since}}, {"_id": 0}))
+        except Exception as e:
+            logger.warning(f"Item co-occurrence sync failed: {e}")
+            return
+        with self._lock:
+            self._apply_cooccurrence(docs)
+            self._synced_at = started
+
+    def record_likes(self, likes: Dict[str, List[str]]):
+        """Adds pair counts for new likes against each user's earlier likes.
+
+        Must run before the users' liked_foods are updated, so repeats can be told apart.
+        """
+        if not likes:
+            return
+        history = CONFIG["item_neighbors_max_history"]
+        prior = {d["user_id"]: list(d.get("liked_foods", []))
+                 for d in mongo_db.users.find({"user_id": {"$in": list(likes)}}, {"user_id": 1, "liked_foods": 1})}
+        incs: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        for uid, fids in likes.items():
+            seen = prior.get(uid, [])[-history:]
+            known = set(seen)
+            for fid in dict.fromkeys(fids):
+                if fid in known:
+                    continue
+                incs[fid]["likes"] += 1
+                for other in seen:
+                    incs[fid][f"counts.{other}"] += 1
+                    incs[other][f"counts.{fid}"] += 1
+                seen.append(fid)
+                known.add(fid)
+        if not incs:
+            return
+        now = datetime.datetime.utcnow()
+        self._col.bulk_write([UpdateOne({"food_id": fid}, {"$inc": dict(inc), "$set": {"updated_at": now}}, upsert=True)
+                              for fid, inc in incs.items()], ordered=False)
+        self._ensure_loaded()
+        self._sync(force=True)
+
+    # --- Serving ---
+    def neighbors_for(self, food_ids: Iterable[str], k: int, exclude: Iterable[str] = ()) -> List[Tuple[str, float]]:
+        """Sums blended neighbor scores over the given foods; returns the top-k other (food_id, score)."""
+        self._ensure_loaded()
+        self._sync()
+        w_co = CONFIG["item_neighbors_cooccur_weight"]
+        with self._lock:
+            rows = np.array([self._row_of[f] for f in dict.fromkeys(food_ids) if f in self._row_of], dtype=np.int64)
+            if not len(rows):
+                return []
+            idx = np.concatenate([self._co_idx[rows].ravel(), self._emb_idx[rows].ravel()])
+            scores = np.concatenate([w_co * self._co_scores[rows].ravel(),
+                                     (1.0 - w_co) * self._emb_scores[rows].ravel()])
+            food_ids_snapshot = self._food_ids
+            excluded = {self._row_of[f] for f in exclude if f in self._row_of} | set(rows.tolist())
+        valid = idx >= 0
+        idx, scores = idx[valid], scores[valid]
+        if not len(idx):
+            return []
+        uniq, inverse = np.unique(idx, return_inverse=True)
+        totals = np.bincount(inverse, weights=scores)
+        if excluded:
+            totals[np.isin(uniq, list(excluded))] = -np.inf
+        n = min(k, int(np.isfinite(totals).sum()))
+        if n <= 0:
+            return []
+        top = np.argpartition(-totals, n - 1)[:n]
+        top = top[np.argsort(-totals[top])]
+        return [(food_ids_snapshot[uniq[i]], float(totals[i])) for i in top]
+
+item_neighbors = ItemNeighbors(ITEM_NEIGHBORS_PATH, CONFIG["item_neighbors_m"],
+                               CONFIG["item_neighbors_refresh_seconds"], mongo_db.item_cooccurrence)
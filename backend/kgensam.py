@@ -1,33 +1,78 @@
-from collections import Counter
+from collections import Counter, OrderedDict
 import math
-from typing import List, Dict
+import threading
+import time
+from typing import List, Dict, Any
 from config import mongo_db, CONFIG
 from groq_api import groq_chat
+from catalog import food_catalog
 
 ATTRIBUTES = CONFIG["active_attributes"]
 
+# user_id -> {"liked": set of food ids, "dists": {attr: Counter}, "at": monotonic time}
+_dist_cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+_dist_lock = threading.Lock()
+
 def get_fuzzy_attributes(user_id: str) -> List[str]:
-    dist_map = {a: _attribute_distribution(user_id, a) for a in ATTRIBUTES}
+    dist_map = attribute_distributions(user_id)
     entropy_map = {a: _entropy(dist_map[a]) for a in ATTRIBUTES}
     return sorted(ATTRIBUTES, key=lambda a: entropy_map[a], reverse=True)
 
+def attribute_distributions(user_id: str) -> Dict[str, Counter]:
+    """All active-attribute distributions in one pass over the user's liked foods (cached per user)."""
+    with _dist_lock:
+        entry = _dist_cache.get(user_id)
+        if entry and time.monotonic() - entry["at"] < CONFIG["kgensam_cache_ttl_seconds"]:
+            _dist_cache.move_to_end(user_id)
+            return entry["dists"]
+    liked = _liked_food_ids(user_id)
+    dists = {a: Counter() for a in ATTRIBUTES}
+    for food in food_catalog.get_many(liked):
+        _count_food(dists, food)
+    with _dist_lock:
+        _dist_cache[user_id] = {"liked": set(liked), "dists": dists, "at": time.monotonic()}
+        _dist_cache.move_to_end(user_id)
+        while len(_dist_cache) > CONFIG["kgensam_cache_size"]:
+            _dist_cache.popitem(last=False)
+    return dists
+
+def record_like(user_id: str, food_id: str):
+    """Fold a new like into the cached distributions instead of recomputing them."""
+    with _dist_lock:
+        entry = _dist_cache.get(user_id)
+        if not entry or food_id in entry["liked"]:
+            return
+        food = food_catalog.get(food_id)
+        entry["liked"].add(food_id)
+        if food:
+            _count_food(entry["dists"], food)
+
+def invalidate_user(user_id: str):
+    with _dist_lock:
+        _dist_cache.pop(user_id, None)
+
+def _count_food(dists: Dict[str, Counter], food):
+    for attr, counter in dists.items():
+        val = getattr(food, attr, None)
+        if val:
+            counter[str(val).strip().lower()] += 1
+
 def calculate_attribute_uncertainty(user_id: str, attribute: str) -> float:
     return round(_entropy(_attribute_distribution(user_id, attribute)), 4)
 
 def explain_recommendation(user_id: str, food_id: str) -> str:
-    food_doc = mongo_db.foods.find_one({"food_id": food_id})
-    if not food_doc:
+    food = food_catalog.get(food_id)
+    if not food:
         return "Recommendation info unavailable."
     liked_ids = _liked_food_ids(user_id)
-    categories = [mongo_db.foods.find_one({"food_id": fid}, {"category": 1}).get("category", "")
-                  for fid in liked_ids]
+    categories = [f.category for f in food_catalog.get_many(liked_ids)]
     cat_counts = Counter([c for c in categories if c])
     top_cat = cat_counts.most_common(1)[0][0] if cat_counts else None
     prompt = (
         f"User has liked {len(liked_ids)} items. "
         f"Main preference category: {top_cat if top_cat else 'unknown'}. "
-        f"Explain briefly why '{food_doc.get('food_name')}' with category '{food_doc.get('category')}' "
-        f"and '{food_doc.get('veg_nonveg')}' suits them. One short paragraph."
+        f"Explain briefly why '{food.food_name}' with category '{food.category}' "
+        f"and '{food.veg_nonveg}' suits them. One short paragraph."
     )
     return groq_chat(prompt, [])
 
@@ -36,12 +81,14 @@ def _liked_food_ids(user_id: str) -> List[str]:
     return udoc.get("liked_foods", []) if udoc else []
 
 def _attribute_distribution(user_id: str, attribute: str) -> Counter:
+    if attribute in ATTRIBUTES:
+        return attribute_distributions(user_id)[attribute]
     liked = _liked_food_ids(user_id)
     values = []
-    for fid in liked:
-        fdoc = mongo_db.foods.find_one({"food_id": fid}, {attribute: 1})
-        if fdoc and fdoc.get(attribute):
-            values.append(str(fdoc[attribute]).strip().lower())
+    for food in food_catalog.get_many(liked):
+        val = getattr(food, attribute, None)
+        if val:
+            values.append(str(val).strip().lower())
     return Counter(values)
 
 def _entropy(counter: Counter) -> float:
@@ -0,0 +1,251 @@
+import os
+import time
+import logging
+import threading
+import numpy as np
+import hashlib
+from collections import OrderedDict, defaultdict
+from typing import Dict, Iterable, List, NamedTuple, Tuple
+from config import mongo_db, CONFIG, MF_MODEL_PATH
+
+logger = logging.getLogger("mf")
+
+Csr = Tuple[np.ndarray, np.ndarray, np.ndarray]  # (indptr, indices, data)
+
+class Factors(NamedTuple):
+    """One published model; swapped as a whole so readers never mix ids and factors of two exports."""
+    user_ids: List[str]
+    user_row: Dict[str, int]
+    user_factors: np.ndarray
+    item_ids: List[str]
+    item_row: Dict[str, int]
+    item_factors: np.ndarray
+
+def interaction_matrix(events: Iterable[Dict]) -> Tuple[List[str], List[str], Csr]:
+    """User x food CSR of net like counts (likes - dislikes), keeping only positive cells."""
+    user_of: Dict[str, int] = {}
+    item_of: Dict[str, int] = {}
+    net: Dict[Tuple[int, int], int] = defaultdict(int)
+    for e in events:
+        u = user_of.setdefault(e["user_id"], len(user_of))
+        i = item_of.setdefault(e["food_id"], len(item_of))
+        net[(u, i)] += 1 if e.get("action") == "like" else -1
+    cells = [(u, i, r) for (u, i), r in net.items() if r > 0]
+    cells.sort()
+    rows = np.array([c[0] for c in cells], dtype=np.int64)
+    indices = np.array([c[1] for c in cells], dtype=np.int32)
+    data = np.array([c[2] for c in cells], dtype=np.float32)
+    indptr = np.zeros(len(user_of) + 1, dtype=np.int64)
+    np.add.at(indptr, rows + 1, 1)
+    return list(user_of), list(item_of), (np.cumsum(indptr), indices, data)
+
+def transpose(csr: Csr, n_cols: int) -> Csr:
+    indptr, indices, data = csr
+    rows = np.repeat(np.arange(len(indptr) - 1, dtype=np.int32), np.diff(indptr))
+    order = np.argsort(indices, kind="stable")
+    t_indptr = np.zeros(n_cols + 1, dtype=np.int64)
+    np.add.at(t_indptr, indices.astype(np.int64) + 1, 1)
+    return np.cumsum(t_indptr), rows[order], data[order]
+
+class ImplicitMF:
+    """Implicit-feedback ALS (confidence c = 1 + alpha * r, preference p = 1 for r > 0).
+
+    Each half-step solves (YtY + Yu^T (Cu - I) Yu + reg I) x_u = Yu^T c_u per row, so the
+    cost is O(nnz * f^2 + rows * f^3) and memory is the CSR arrays plus two factor matrices;
+    no dense user x food matrix is ever built. Factors are exported to an npz for serving.
+    """
+
+    def __init__(self, path: str, factors: int, reg: float, alpha: float, refresh_seconds: int):
+        self.path = path
+        self.factors = factors
+        self.reg = reg
+        self.alpha = alpha
+        self.refresh_seconds = refresh_seconds
+        self._lock = threading.Lock()
+        empty = np.zeros((0, factors), dtype=np.float32)
+        self._model = Factors([], {}, empty, [], {}, empty)
+        self._mtime = None
+        self._checked_at = 0.0
+        self._folded: "OrderedDict[Tuple[str, str], np.ndarray]" = OrderedDict()
+
+    # --- Training ---
+    def _half_step(self, fixed: np.ndarray, csr: Csr, out: np.ndarray):
+        indptr, indices, data = csr
+        gram = fixed.T @ fixed + self.reg * np.eye(self.factors, dtype=np.float32)
+        for r in range(len(indptr) - 1):
+            start, end = indptr[r], indptr[r + 1]
+            if start == end:
+                out[r] = 0.0
+                continue
+            out[r] = self._solve(gram, fixed[indices[start:end]], data[start:end])
+
+    def _solve(self, gram: np.ndarray, factors: np.ndarray, counts: np.ndarray) -> np.ndarray:
+        conf = 1.0 + self.alpha * counts
+        a = gram + (factors.T * (conf - 1.0)) @ factors
+        b = factors.T @ conf
+        return np.linalg.solve(a, b)
+
+    def train(self, iterations: int | None = None, warm_start: bool = True) -> Dict[str, float]:
+        """Trains on mongo_db.interactions; with warm_start, known users/items keep their factors as init."""
+        iterations = iterations or CONFIG["mf_iterations"]
+        started = time.perf_counter()
+        events = mongo_db.interactions.find({"food_id": {"$ne": None}, "action": {"$in": ["like", "dislike"]}},
+                                            {"user_id": 1, "food_id": 1, "action": 1})
+        user_ids, item_ids, csr = interaction_matrix(events)
+        if not user_ids:
+            return {"users": 0, "items": 0, "nnz": 0, "seconds": 0.0}
+        csr_t = transpose(csr, len(item_ids))
+
+        rng = np.random.default_rng(0)
+        users = (rng.standard_normal((len(user_ids), self.factors)) * 0.01).astype(np.float32)
+        items = (rng.standard_normal((len(item_ids), self.factors)) * 0.01).astype(np.float32)
+        if warm_start:
+            self._ensure_loaded()
+            model = self.snapshot()
+            for i, uid in enumerate(user_ids):
+                if uid in model.user_row:
+                    users[i] = model.user_factors[model.user_row[uid]]
+            for i, fid in enumerate(item_ids):
+                if fid in model.item_row:
+                    items[i] = model.item_factors[model.item_row[fid]]
+
+        for it in range(iterations):
+            self._half_step(items, csr, users)
+            self._half_step(users, csr_t, items)
+            logger.info(f"ALS iteration {it + 1}/{iterations} done")
+
+        self._publish(user_ids, users, item_ids, items)
+        self.save()
+        stats = {"users": len(user_ids), "items": len(item_ids), "nnz": int(len(csr[1])),
+                 "seconds": round(time.perf_counter() - started, 2)}
+        logger.info(f"Trained implicit ALS: {stats}")
+        return stats
+
+    def fold_in_users(self, user_ids: Iterable[str] | None = None) -> int:
+        """Warm-start update: solves factors for the given (or all not-yet-modelled) users from their
+        current liked_foods with item factors fixed, then re-exports. No full retrain needed."""
+        self._ensure_loaded()
+        model = self.snapshot()
+        query = {"liked_foods.0": {"$exists": True}}
+        if user_ids is not None:
+            query["user_id"] = {"$in": list(user_ids)}
+        docs = [d for d in mongo_db.users.find(query, {"user_id": 1, "liked_foods": 1})
+                if user_ids is not None or d["user_id"] not in model.user_row]
+        solved = {}
+        for d in docs:
+            vec = self._fold_in(model, d["liked_foods"])
+            if vec is not None:
+                solved[d["user_id"]] = vec
+        if not solved:
+            return 0
+        # Published arrays are shared with readers, so updates go into a copy
+        user_ids_all = list(model.user_ids)
+        users = model.user_factors.copy()
+        extra = []
+        for uid, vec in solved.items():
+            if uid in model.user_row:
+                users[model.user_row[uid]] = vec
+            else:
+                user_ids_all.append(uid)
+                extra.append(vec)
+        if extra:
+            users = np.vstack([users, np.stack(extra).astype(np.float32)])
+        self._publish(user_ids_all, users, model.item_ids, model.item_factors)
+        self.save()
+        return len(solved)
+
+    def _fold_in(self, model: Factors, food_ids: Iterable[str]) -> np.ndarray | None:
+        rows = [model.item_row[f] for f in dict.fromkeys(food_ids) if f in model.item_row]
+        if not rows:
+            return None
+        items = model.item_factors
+        gram = items.T @ items + self.reg * np.eye(self.factors, dtype=np.float32)
+        return self._solve(gram, items[rows], np.ones(len(rows), dtype=np.float32)).astype(np.float32)
+
+    def _publish(self, user_ids, users, item_ids, items):
+        user_ids, item_ids = list(user_ids), list(item_ids)
+        model = Factors(user_ids, {uid: i for i, uid in enumerate(user_ids)},
+                        np.ascontiguousarray(users, dtype=np.float32),
+                        item_ids, {fid: i for i, fid in enumerate(item_ids)},
+                        np.ascontiguousarray(items, dtype=np.float32))
+        with self._lock:
+            self._model = model
+            self._folded.clear()
+
+    def snapshot(self) -> Factors:
+        with self._lock:
+            return self._model
+
+    # --- Export / load ---
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = self.path + ".tmp.npz"
+        model = self.snapshot()
+        np.savez(tmp, user_ids=np.array(model.user_ids), user_factors=model.user_factors,
+                 item_ids=np.array(model.item_ids), item_factors=model.item_factors)
+        os.replace(tmp, self.path)
+        self._mtime = os.path.getmtime(self.path)
+
+    def _ensure_loaded(self):
+        # Picks up a newer export (training runs out of process) at most every refresh_seconds
+        if self._mtime is not None and time.monotonic() - self._checked_at < self.refresh_seconds:
+            return
+        self._checked_at = time.monotonic()
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return
+        if mtime == self._mtime:
+            return
+        data = np.load(self.path)
+        self._publish([str(u) for u in data["user_ids"]], data["user_factors"],
+                      [str(i) for i in data["item_ids"]], data["item_factors"])
+        self._mtime = mtime
+        model = self.snapshot()
+        logger.info(f"Loaded MF factors: {len(model.user_ids)} users x {len(model.item_ids)} foods")
+
+    # --- Serving ---
+    def user_vector(self, user_id: str, liked_foods: List[str], model: Factors | None = None) -> np.ndarray | None:
+        """Exported factor when the user was modelled, else an on-the-fly fold-in of their likes."""
+        if model is None:
+            self._ensure_loaded()
+            model = self.snapshot()
+        row = model.user_row.get(user_id)
+        if row is not None:
+            return model.user_factors[row]
+        # Keyed on the liked set itself: swapping one like for another must not hit the old entry
+        liked = sorted(set(liked_foods))
+        key = (user_id, hashlib.sha1("\x1f".join(liked).encode()).hexdigest())
+        with self._lock:
+            vec = self._folded.get(key) if self._model is model else None
+        if vec is None:
+            vec = self._fold_in(model, liked)
+            if vec is None:
+                return None
+            with self._lock:
+                # A fold-in against factors that were replaced meanwhile is not cached
+                if self._model is model:
+                    self._folded[key] = vec
+                    while len(self._folded) > CONFIG["mf_fold_in_cache_size"]:
+                        self._folded.popitem(last=False)
+        return vec
+
+    def recommend(self, user_id: str, liked_foods: List[str], k: int,
+                  exclude: Iterable[str] = ()) -> List[Tuple[str, float]]:
+        self._ensure_loaded()
+        model = self.snapshot()
+        vec = self.user_vector(user_id, liked_foods, model)
+        if vec is None:
+            return []
+        scores = model.item_factors @ vec
+        skip = [model.item_row[f] for f in set(exclude) if f in model.item_row]
+        if skip:
+            scores[skip] = -np.inf
+        n = min(k, len(scores) - len(skip))
+        if n <= 0:
+            return []
+        top = np.argpartition(-scores, n - 1)[:n]
+        return [(model.item_ids[i], float(scores[i])) for i in top[np.argsort(-scores[top])]]
+
+mf_model = ImplicitMF(MF_MODEL_PATH, CONFIG["mf_factors"], CONFIG["mf_reg"], CONFIG["mf_alpha"],
+                      CONFIG["mf_refresh_seconds"])
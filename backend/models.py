@@ -1,4 +1,4 @@
-from dataclasses import dataclass, field, asdict
+from dataclasses import dataclass, field, fields, asdict
 from typing import Optional, List, Dict, Any
 import datetime
 import uuid
@@ -55,9 +55,9 @@ class Food:
 
     @staticmethod
     def from_payload(payload: Dict[str, Any]) -> "Food":
-        payload = dict(payload)
-        payload.pop("_id", None)
-        return Food(**payload)
+        # Mongo docs may carry extra keys (_id, upvotes, community_source, ...)
+        names = {f.name for f in fields(Food)}
+        return Food(**{k: v for k, v in payload.items() if k in names})
 
 @dataclass
 class Restaurant:
@@ -0,0 +1,158 @@
+import datetime
+import logging
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Tuple
+from pymongo import UpdateOne
+from config import mongo_db, CONFIG
+from trending import trending_boards
+from vector_store import food_matrix
+
+logger = logging.getLogger("precompute")
+
+# One doc per user in mongo_db.precomputed_recs:
+#   {user_id, food_ids: [...], restaurant_ids: [...], computed_at, dirty_at}
+# Feedback sets dirty_at; an entry is served only while computed_at > dirty_at and it is
+# younger than precompute_max_age_hours.
+
+def _food_matrix() -> Tuple[np.ndarray, List[str], List[str]]:
+    matrix, payloads = food_matrix()
+    return matrix, [str(p.get("food_id")) for p in payloads], [str(p.get("restaurant_id") or "") for p in payloads]
+
+# --- Worker side (pure NumPy; no DB access in the pool) ---
+_worker_foods: np.ndarray | None = None
+_worker_bias: np.ndarray | None = None
+_worker_id_order: np.ndarray | None = None
+_worker_id_starts: np.ndarray | None = None
+
+def _init_worker(food_matrix: np.ndarray, bias: np.ndarray, id_order: np.ndarray, id_starts: np.ndarray):
+    global _worker_foods, _worker_bias, _worker_id_order, _worker_id_starts
+    _worker_foods, _worker_bias = food_matrix, bias
+    _worker_id_order, _worker_id_starts = id_order, id_starts
+
+def _top(scores: np.ndarray, top_n: int) -> np.ndarray:
+    n = min(top_n, scores.shape[1])
+    top = np.argpartition(-scores, n - 1, axis=1)[:, :n]
+    order = np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1)
+    return np.take_along_axis(top, order, axis=1).astype(np.int32)
+
+def _score_shard(users: np.ndarray, adjust_rows: np.ndarray, adjust_cols: np.ndarray, adjust_vals: np.ndarray,
+                 top_n: int) -> Tuple[np.ndarray, np.ndarray]:
+    """users: (u, d) normalized vectors; adjust_*: sparse per-user score offsets (likes/dislikes).
+    Returns the top food_id codes (an id scores as its best row) and the top rows."""
+    scores = users @ _worker_foods.T
+    scores += _worker_bias
+    if len(adjust_rows):
+        np.add.at(scores, (adjust_rows, adjust_cols), adjust_vals)
+    best = np.maximum.reduceat(scores[:, _worker_id_order], _worker_id_starts, axis=1)
+    return _top(best, top_n), _top(scores, top_n)
+
+# --- Driver ---
+def _active_user_vectors(user_ids: List[str] | None) -> Tuple[List[str], np.ndarray]:
+    cutoff = datetime.datetime.utcnow() - datetime.timedelta(days=CONFIG["precompute_active_days"])
+    query = {"updated_at": {"$gte": cutoff}}
+    if user_ids is not None:
+        query["user_id"] = {"$in": list(user_ids)}
+    uids, vecs = [], []
+    for doc in mongo_db.user_vectors.find(query, {"user_id": 1, "sum": 1}):
+        vec = np.frombuffer(doc["sum"], dtype=np.float32)
+        norm = float(np.linalg.norm(vec))
+        if norm > 0:
+            uids.append(doc["user_id"])
+            vecs.append(vec / norm)
+    if not vecs:
+        return [], np.zeros((0, CONFIG["user_vector_size"]), dtype=np.float32)
+    return uids, np.stack(vecs).astype(np.float32)
+
+def precompute_recommendations(user_ids: List[str] | None = None, stale_only: bool = False,
+                               workers: int | None = None, shard_size: int = 512) -> int:
+    """Scores active users against every food (cosine + trending prior + like/dislike offsets)
+    in shards across a process pool and stores each user's top-N foods and restaurants."""
+    mongo_db.precomputed_recs.create_index("user_id", unique=True)
+    if stale_only:
+        # Users whose entry was invalidated by feedback, plus users that have none yet
+        fresh = {d["user_id"] for d in mongo_db.precomputed_recs.find({}, {"user_id": 1, "computed_at": 1, "dirty_at": 1})
+                 if not d.get("dirty_at") or d["dirty_at"] < d["computed_at"]}
+        user_ids = [d["user_id"] for d in mongo_db.user_vectors.find({}, {"user_id": 1}) if d["user_id"] not in fresh]
+    uids, user_matrix = _active_user_vectors(user_ids)
+    food_matrix, food_ids, restaurant_ids = _food_matrix()
+    if not uids or not food_ids:
+        return 0
+    # food_ids repeat across rows (raw food.csv): an id's offsets apply to every one of its rows
+    cols_of: Dict[str, List[int]] = {}
+    for i, fid in enumerate(food_ids):
+        cols_of.setdefault(fid, []).append(i)
+    distinct_ids = list(cols_of)
+    id_order = np.array([c for fid in distinct_ids for c in cols_of[fid]], dtype=np.int64)
+    id_starts = np.cumsum([0] + [len(cols_of[fid]) for fid in distinct_ids[:-1]]).astype(np.int64)
+
+    # Trending prior: rank-based so it stays on the cosine scale (forward-decay scores don't)
+    bias = np.zeros(len(food_ids), dtype=np.float32)
+    board = trending_boards.top(None, trending_boards.top_k)
+    for rank, fid in enumerate(board):
+        if fid in cols_of:
+            bias[cols_of[fid]] = CONFIG["precompute_trending_weight"] * (1.0 - rank / max(len(board), 1))
+
+    likes = {d["user_id"]: d for d in mongo_db.users.find({"user_id": {"$in": uids}},
+                                                           {"user_id": 1, "liked_foods": 1, "disliked_foods": 1})}
+    top_n = CONFIG["precompute_top_n"]
+    shards = []
+    for start in range(0, len(uids), shard_size):
+        rows, cols, vals = [], [], []
+        for r, uid in enumerate(uids[start:start + shard_size]):
+            doc = likes.get(uid, {})
+            # Liked foods get a small bonus; disliked ones are pushed below any cosine score
+            offsets = [(fid, CONFIG["precompute_liked_bonus"]) for fid in doc.get("liked_foods", [])]
+            offsets += [(fid, -10.0) for fid in doc.get("disliked_foods", [])]
+            for fid, val in offsets:
+                for c in cols_of.get(fid, ()):
+                    rows.append(r)
+                    cols.append(c)
+                    vals.append(val)
+        shards.append((start, user_matrix[start:start + shard_size], np.array(rows, dtype=np.int64),
+                       np.array(cols, dtype=np.int64), np.array(vals, dtype=np.float32)))
+
+    workers = workers or CONFIG["precompute_workers"]
+    now = datetime.datetime.utcnow()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(food_matrix, bias, id_order, id_starts)) as pool:
+        futures = [(start, pool.submit(_score_shard, users, r, c, v, top_n)) for start, users, r, c, v in shards]
+        for start, fut in futures:
+            top_ids, top_rows = fut.result()
+            ops = []
+            for i, (codes, cols) in enumerate(zip(top_ids, top_rows)):
+                disliked = set(likes.get(uids[start + i], {}).get("disliked_foods", []))
+                fids = [distinct_ids[c] for c in codes if distinct_ids[c] not in disliked]
+                rids = list(dict.fromkeys(restaurant_ids[c] for c in cols
+                                          if restaurant_ids[c] and food_ids[c] not in disliked))
+                ops.append(UpdateOne({"user_id": uids[start + i]},
+                                     {"$set": {"food_ids": fids, "restaurant_ids": rids[:CONFIG["precompute_top_restaurants"]],
+                                               "computed_at": now}}, upsert=True))
+            mongo_db.precomputed_recs.bulk_write(ops, ordered=False)
+    logger.info(f"Precomputed top-{top_n} for {len(uids)} users over {len(distinct_ids)} foods ({workers} workers)")
+    return len(uids)
+
+# --- Serving side ---
+def mark_dirty(user_ids: List[str]):
+    """Called on feedback: the stored list no longer reflects the user's latest likes."""
+    if user_ids:
+        mongo_db.precomputed_recs.update_many({"user_id": {"$in": list(set(user_ids))}},
+                                              {"$set": {"dirty_at": datetime.datetime.utcnow()}})
+
+def _fresh_entry(user_id: str, field: str) -> List[str] | None:
+    doc = mongo_db.precomputed_recs.find_one({"user_id": user_id},
+                                             {field: 1, "computed_at": 1, "dirty_at": 1})
+    if not doc or not doc.get(field):
+        return None
+    computed_at = doc.get("computed_at")
+    max_age = datetime.timedelta(hours=CONFIG["precompute_max_age_hours"])
+    if computed_at is None or datetime.datetime.utcnow() - computed_at > max_age:
+        return None
+    if doc.get("dirty_at") and doc["dirty_at"] >= computed_at:
+        return None
+    return doc[field]
+
+def precomputed_food_ids(user_id: str) -> List[str] | None:
+    return _fresh_entry(user_id, "food_ids")
+
+def precomputed_restaurant_ids(user_id: str) -> List[str] | None:
+    return _fresh_entry(user_id, "restaurant_ids")
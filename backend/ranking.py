@@ -0,0 +1,87 @@
+import numpy as np
+from typing import Dict, Iterable, List, Sequence, Tuple
+from config import CONFIG
+
+# A source result is an ordered list of (food_id, score); score may be None for rank-only sources
+Scored = List[Tuple[str, float | None]]
+
+class CandidatePool:
+    """Columnar view of all candidates: one row per distinct food id, one column per source.
+
+    `ranks[i, s]` is the row's 0-based position in source s (-1 when absent) and `scores[i, s]`
+    the source's own score (NaN when absent or unscored). Fusion works on these arrays only.
+    """
+
+    def __init__(self, results: Dict[str, Scored]):
+        self.sources = list(results)
+        row_of: Dict[str, int] = {}
+        codes, cols, ranks, scores = [], [], [], []
+        for s, name in enumerate(self.sources):
+            for rank, (fid, score) in enumerate(results[name]):
+                codes.append(row_of.setdefault(fid, len(row_of)))
+                cols.append(s)
+                ranks.append(rank)
+                scores.append(np.nan if score is None else score)
+        self.food_ids = list(row_of)
+        self.row_of = row_of
+        n, m = len(self.food_ids), len(self.sources)
+        self.ranks = np.full((n, m), -1, dtype=np.int32)
+        self.scores = np.full((n, m), np.nan, dtype=np.float32)
+        if codes:
+            rows, cols = np.array(codes), np.array(cols)
+            # A repeated id within one source keeps its best (first) rank
+            self.ranks[rows[::-1], cols[::-1]] = np.array(ranks, dtype=np.int32)[::-1]
+            self.scores[rows[::-1], cols[::-1]] = np.array(scores, dtype=np.float32)[::-1]
+
+    def __len__(self):
+        return len(self.food_ids)
+
+    def mask(self, food_ids: Iterable[str]) -> np.ndarray:
+        rows = [self.row_of[f] for f in food_ids if f in self.row_of]
+        out = np.zeros(len(self.food_ids), dtype=bool)
+        out[rows] = True
+        return out
+
+    def _weights(self, weights: Dict[str, float]) -> np.ndarray:
+        return np.array([weights.get(s, weights.get("default", 0.0)) for s in self.sources], dtype=np.float32)
+
+    def rrf(self, weights: Dict[str, float], c: float) -> np.ndarray:
+        """Weighted reciprocal-rank fusion: sum_s w_s / (c + rank_s + 1)."""
+        present = self.ranks >= 0
+        contrib = np.where(present, 1.0 / (c + self.ranks + 1.0), 0.0)
+        return contrib @ self._weights(weights)
+
+    def weighted(self, weights: Dict[str, float]) -> np.ndarray:
+        """Weighted sum of per-source min-max normalized scores (rank-derived for unscored sources)."""
+        present = self.ranks >= 0
+        lengths = np.maximum(present.sum(axis=0), 1)
+        by_rank = 1.0 - self.ranks / lengths
+        scores = np.where(np.isnan(self.scores), by_rank, self.scores)
+        lo = np.where(present, scores, np.inf).min(axis=0)
+        hi = np.where(present, scores, -np.inf).max(axis=0)
+        spread = hi > lo
+        with np.errstate(invalid="ignore"):
+            norm = np.where(spread, (scores - lo) / np.where(spread, hi - lo, 1.0), 1.0)
+        norm = np.where(present, norm, 0.0)
+        return norm @ self._weights(weights)
+
+    def top(self, k: int, method: str | None = None, exclude: Sequence[str] = (),
+            keep: np.ndarray | None = None) -> List[str]:
+        """Fused top-k ids; `exclude` ids and rows where `keep` is False are never returned."""
+        if not len(self):
+            return []
+        method = method or CONFIG["fusion_method"]
+        weights = CONFIG["fusion_weights"]
+        fused = self.rrf(weights, CONFIG["rrf_k"]) if method == "rrf" else self.weighted(weights)
+        fused = fused.astype(np.float64)
+        if exclude:
+            fused[self.mask(exclude)] = -np.inf
+        if keep is not None:
+            fused[~keep] = -np.inf
+        n = min(k, int(np.isfinite(fused).sum()))
+        if n <= 0:
+            return []
+        top = np.argpartition(-fused, n - 1)[:n]
+        # Ties (e.g. equal RRF sums) fall back to first-seen order, which follows source order
+        top = top[np.lexsort((top, -fused[top]))]
+        return [self.food_ids[i] for i in top]
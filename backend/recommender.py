@@ -1,12 +1,30 @@
-from typing import List, Dict, Any
-from config import mongo_db, qdrant, CONFIG
+from typing import List, Dict, Any, Callable
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from config import mongo_db, CONFIG
 from models import Food, User
 from util import embed_text_gemini
+from catalog import food_catalog
+from vector_store import food_vector_backend, SearchHit
+from trending import trending_boards
+from community import community_set
+from restaurants import restaurant_directory
+from metrics import timed, stage_timer, stage_seconds, candidate_source_total
+from precompute import precomputed_food_ids, precomputed_restaurant_ids
+from item_neighbors import item_neighbors
+from mf import mf_model
+from ranking import CandidatePool, Scored
+from attribute_index import AttributeIndex
 import logging
-import random
+import threading
+import time
+import numpy as np
 
 logger = logging.getLogger("recommender")
 
+_candidate_pool = ThreadPoolExecutor(max_workers=CONFIG["candidate_pool_workers"], thread_name_prefix="candidates")
+_source_stats: Dict[str, Dict[str, float]] = {}
+_source_stats_lock = threading.Lock()
+
 def get_user(user_id: str) -> User:
     doc = mongo_db.users.find_one({"user_id": user_id})
     if doc:
@@ -18,70 +36,136 @@ def get_user_liked_foods(user_id: str, limit=8) -> List[Food]:
     doc = mongo_db.users.find_one({"user_id": user_id}, {"liked_foods": 1})
     if not doc:
         return []
-    foods = []
-    for fid in doc.get("liked_foods", [])[:limit]:
-        fdoc = mongo_db.foods.find_one({"food_id": fid})
-        if fdoc:
-            foods.append(Food.from_payload(fdoc))
-    return foods
-
-def _vector_search_foods(query: str, k: int = 30) -> List[Food]:
+    return food_catalog.get_many(doc.get("liked_foods", [])[:limit])
+
+def _vector_search(query: str, k: int = 30, filters: Dict[str, Any] | None = None) -> List[SearchHit]:
     text = query.strip() or "popular south indian dish"
-    vec = embed_text_gemini(text).tolist()
+    with stage_timer("recommend.embed"):
+        vec = embed_text_gemini(text)
     try:
-        results = qdrant.search(collection_name="food_collection",
-                                query_vector=vec,
-                                limit=k,
-                                with_payload=True)
-        return [Food.from_payload(r.payload) for r in results if r.payload]
+        # Filters are evaluated inside the search (Qdrant payload filter / local mask)
+        with stage_timer("recommend.vector_search"):
+            results = food_vector_backend().search(vec, k, filters=filters)
     except Exception as e:
         logger.warning(f"Vector search failed: {e}")
         return []
+    return results
 
-def _collaborative_foods(user: User, k: int = 10) -> List[Food]:
-    # Simple heuristic (embedding similarity optional improvement)
-    doc = mongo_db.users.find_one({"user_id": user.user_id}, {"liked_foods": 1})
-    if not doc:
-        return []
-    liked = list(doc.get("liked_foods", []))
-    random.shuffle(liked)
+def _collaborative_scored(user: User, k: int = 10) -> Scored:
+    # Neighbors of the user's liked dishes (co-likes blended with embedding similarity)
+    exclude = set(user.liked_foods) | set(user.disliked_foods)
+    return item_neighbors.neighbors_for(user.liked_foods, k, exclude=exclude)
+
+def _mf_scored(user: User, k: int = 10) -> Scored:
+    # Dot product against exported ALS item factors; unmodelled users are folded in from their likes
+    exclude = set(user.liked_foods) | set(user.disliked_foods)
+    return mf_model.recommend(user.user_id, user.liked_foods, k, exclude=exclude)
+
+def _trending_foods(area: str | None, k: int = 10) -> List[Food]:
+    return food_catalog.get_many(trending_boards.top(area, k))
+
+def _sample(food_ids: List[str], k: int) -> List[str]:
+    if len(food_ids) <= k:
+        return food_ids
+    return [food_ids[i] for i in np.random.choice(len(food_ids), k, replace=False)]
+
+def _materialize(food_ids: List[str], payloads: Dict[str, Dict[str, Any]],
+                 attributes: AttributeIndex | None = None, allowed: np.ndarray | None = None) -> List[Food]:
+    """Food objects for the final ids only. Vector hits are built from their own search payload,
+    which passed the filters; with filters, other candidates use their first catalog row that
+    passes them (a food_id can span rows), else the catalog's row for the id."""
+    found = {} if allowed is not None else \
+        {f.food_id: f for f in food_catalog.get_many(fid for fid in food_ids if fid not in payloads)}
     out = []
-    for fid in liked[:k]:
-        fdoc = mongo_db.foods.find_one({"food_id": fid})
-        if fdoc:
-            out.append(Food.from_payload(fdoc))
+    for fid in food_ids:
+        if fid in payloads:
+            food = Food.from_payload(payloads[fid])
+        elif allowed is not None:
+            row = attributes.first_row(fid, allowed)
+            food = Food.from_payload(attributes.rows[row]) if row is not None else None
+        else:
+            food = found.get(fid)
+        if food is not None:
+            out.append(food)
     return out
 
-def _trending_foods(area: str | None, k: int = 10) -> List[Food]:
-    q = {}
-    if area:
-        q["popular_in"] = {"$regex": area, "$options": "i"}
-    pop_cursor = mongo_db.food_popularity.find(q).sort("score", -1)
-    result = []
-    for item in pop_cursor:
-        fdoc = mongo_db.foods.find_one({"food_id": item["food_id"]})
-        if fdoc:
-            result.append(Food.from_payload(fdoc))
-        if len(result) >= k:
-            break
-    return result
-
-def _community_foods(k: int = 6) -> List[Food]:
-    approved = list(mongo_db.community_suggestions.find({"status": "approved", "food_id": {"$exists": True}}))
-    foods: List[Food] = []
-    for sug in approved:
-        fdoc = mongo_db.foods.find_one({"food_id": sug["food_id"]})
-        if fdoc:
-            foods.append(Food.from_payload(fdoc))
-    random.shuffle(foods)
-    return foods[:k]
+def _relax_filters(attributes: AttributeIndex, filters: Dict[str, Any]) -> Dict[str, Any]:
+    """Filters that jointly match catalog rows. A filter that would leave nothing (a free-text
+    area such as 'Gandhipuram' that no row carries, or a clash with earlier answers) is dropped."""
+    kept: Dict[str, Any] = {}
+    for key, val in filters.items():
+        if not attributes.has_field(key):
+            # Attributes the catalog carries no values for (e.g. spice_level) can't narrow anything down
+            continue
+        if attributes.select({**kept, key: val}).any():
+            kept[key] = val
+        else:
+            logger.info(f"Filter {key}={val!r} matches no catalog row, ignoring it")
+    return kept
+
+def _record_source(name: str, elapsed_ms: float | None = None, outcome: str | None = None):
+    with _source_stats_lock:
+        st = _source_stats.setdefault(name, {"calls": 0, "timeouts": 0, "errors": 0,
+                                             "total_ms": 0.0, "max_ms": 0.0})
+        if elapsed_ms is not None:
+            st["calls"] += 1
+            st["total_ms"] += elapsed_ms
+            st["max_ms"] = max(st["max_ms"], elapsed_ms)
+        st["timeouts"] += int(outcome == "timeout")
+        st["errors"] += int(outcome == "error")
+    if elapsed_ms is not None:
+        stage_seconds.observe(elapsed_ms / 1000, stage=f"candidates.{name}")
+    if outcome is not None:
+        candidate_source_total.inc(source=name, outcome=outcome)
+
+def candidate_source_stats() -> Dict[str, Dict[str, float]]:
+    with _source_stats_lock:
+        out = {}
+        for name, st in _source_stats.items():
+            out[name] = dict(st, avg_ms=round(st["total_ms"] / st["calls"], 2) if st["calls"] else 0.0)
+        return out
+
+def _run_source(name: str, fn: Callable[[], List], settled: threading.Lock) -> List:
+    # `settled` is claimed by whoever records the call's outcome first: this worker or a timed-out caller
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        result = fn()
+        outcome = "completed"
+        return result
+    finally:
+        # Latency is recorded even when the caller has already given up on this source
+        _record_source(name, elapsed_ms=(time.perf_counter() - started) * 1000,
+                       outcome=outcome if settled.acquire(blocking=False) else None)
 
+def _gather_candidates(sources: Dict[str, Callable[[], List]]) -> Dict[str, List]:
+    """Each source's own result once it settles in time, else []. A source that times out keeps
+    running, but its result is never read, so sources must not write to shared state."""
+    started = time.monotonic()
+    timeouts = CONFIG["candidate_timeouts"]
+    settled = {name: threading.Lock() for name in sources}
+    futures = {name: _candidate_pool.submit(_run_source, name, fn, settled[name]) for name, fn in sources.items()}
+    results: Dict[str, List] = {}
+    for name, fut in futures.items():
+        remaining = started + timeouts.get(name, timeouts["default"]) - time.monotonic()
+        try:
+            results[name] = fut.result(timeout=max(remaining, 0))
+        except FutureTimeout:
+            logger.warning(f"Candidate source '{name}' timed out, dropping it")
+            if settled[name].acquire(blocking=False):
+                _record_source(name, outcome="timeout")
+            results[name] = []
+        except Exception as e:
+            logger.warning(f"Candidate source '{name}' failed: {e}")
+            results[name] = []
+    return results
+
+@timed("recommend")
 def hybrid_food_recommend(user: User,
                           query: str,
                           filters: Dict[str, Any],
                           k: int | None = None) -> List[Food]:
     k = k or CONFIG["default_rec_k"]
-    vec_candidates = _vector_search_foods(query, k=CONFIG["max_food_vector_candidates"])
     normalized_filters = {}
     for key, val in filters.items():
         if not val:
@@ -91,47 +175,58 @@ def hybrid_food_recommend(user: User,
         else:
             normalized_filters[key] = val
 
-    filtered = []
-    for f in vec_candidates:
-        keep = True
-        for key, val in normalized_filters.items():
-            fv = getattr(f, key, "") or ""
-            if val and isinstance(fv, str) and val.lower() not in fv.lower():
-                keep = False
-                break
-        if keep:
-            filtered.append(f)
-
-    collab = _collaborative_foods(user, k=8)
-    trending = _trending_foods(normalized_filters.get("popular_in"), k=8)
-    community = _community_foods(k=5)
-    liked = get_user_liked_foods(user.user_id, limit=6)
-
-    merged = filtered + collab + trending + community + liked
-    unique_map = {}
-    for item in merged:
-        if item.food_id not in unique_map:
-            unique_map[item.food_id] = item
-            if len(unique_map) >= k:
-                break
-
-    result = list(unique_map.values())
-    if not result:
-        fallback = trending or vec_candidates
-        return fallback[:k]
-    return result[:k]
+    if not query.strip() and not normalized_filters:
+        # Typical app-open request: serve the batch-computed list while it is fresh
+        with stage_timer("recommend.precomputed"):
+            # Entries from older jobs may repeat ids; a disliked food is never served either way
+            ids = [fid for fid in dict.fromkeys(precomputed_food_ids(user.user_id) or [])
+                   if fid not in user.disliked_foods]
+            foods = food_catalog.get_many(ids) if ids else []
+        if foods:
+            return foods[:k]
+
+    attributes = food_catalog.attributes()
+    active_filters = _relax_filters(attributes, normalized_filters)
+    allowed = attributes.select(active_filters) if active_filters else None
+
+    sizes = CONFIG["candidate_pool_sizes"]
+    sources = {
+        "vector": lambda: _vector_search(query, k=max(k, sizes["vector"]), filters=active_filters),
+        "collaborative": lambda: _collaborative_scored(user, k=sizes["collaborative"]),
+        "mf": lambda: _mf_scored(user, k=sizes["mf"]),
+        "trending": lambda: trending_boards.top_scored(active_filters.get("popular_in"), sizes["trending"]),
+        "community": lambda: [(fid, None) for fid in community_set.sample(sizes["community"])],
+        "liked": lambda: [(fid, None) for fid in user.liked_foods[:sizes["liked"]]],
+    }
+    if allowed is not None:
+        sources["attributes"] = lambda: [(fid, None) for fid in _sample(attributes.ids(allowed), sizes["attributes"])]
+    candidates = _gather_candidates(sources)
+    hits = candidates["vector"]
+    candidates["vector"] = [(str(p.get("food_id")), score) for p, score in hits]
+    # A food_id can name several rows; the best-scoring hit's payload is the one that matched
+    payloads: Dict[str, Dict[str, Any]] = {}
+    for p, _ in hits:
+        payloads.setdefault(str(p.get("food_id")), p)
+    with stage_timer("recommend.fusion"):
+        pool = CandidatePool(candidates)
+        # Every source, not just the vector search, has to satisfy the filters
+        keep = attributes.contains(pool.food_ids, allowed) if allowed is not None else None
+        ids = pool.top(k, exclude=user.disliked_foods, keep=keep)
+        if not ids and allowed is not None:
+            # Nothing gathered passes the filters: better the unfiltered candidates than no answer
+            logger.info(f"No candidate passes {active_filters}, falling back to unfiltered candidates")
+            ids, allowed = pool.top(k, exclude=user.disliked_foods), None
+    return _materialize(ids, payloads, attributes, allowed)
 
 def recommend_restaurants_from_foods(foods: List[Food], limit: int = 5) -> List[Dict[str, Any]]:
-    seen = set()
-    output = []
-    for f in foods:
-        if f.restaurant_id in seen:
-            continue
-        rdoc = mongo_db.restaurants.find_one({"restaurant_id": f.restaurant_id})
-        if rdoc:
-            rdoc.pop("_id", None)
-            output.append(rdoc)
-            seen.add(f.restaurant_id)
-        if len(output) >= limit:
-            break
-    return output
\ No newline at end of file
+    return restaurant_directory.get_many(f.restaurant_id for f in foods)[:limit]
+
+@timed("recommend_restaurants")
+def recommend_restaurants_for_user(user_id: str, limit: int = 5) -> List[Dict[str, Any]]:
+    # Restaurants of the batch-computed food list while it is fresh, else those of the user's likes
+    with stage_timer("recommend_restaurants.precomputed"):
+        ids = precomputed_restaurant_ids(user_id)
+        found = restaurant_directory.get_many(ids) if ids else []
+    if found:
+        return found[:limit]
+    return recommend_restaurants_from_foods(get_user_liked_foods(user_id), limit)
@@ -0,0 +1,83 @@
+import threading
+import time
+import logging
+from typing import Dict, Iterable, List, Optional, Any
+from config import mongo_db, CONFIG
+
+logger = logging.getLogger("restaurants")
+
+class RestaurantDirectory:
+    """Fully cached restaurants table keyed by restaurant_id.
+
+    Docs are stored JSON-ready (no _id) and shared between requests, so callers
+    must treat them as read-only. Unknown ids are fetched with one $in query.
+    """
+
+    def __init__(self, collection, refresh_seconds: int):
+        self._collection = collection
+        self._refresh_seconds = refresh_seconds
+        self._docs: Dict[str, Dict[str, Any]] = {}
+        self._missing: set = set()
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    def refresh(self) -> int:
+        docs = {d["restaurant_id"]: d for d in self._collection.find({"restaurant_id": {"$exists": True}}, {"_id": 0})}
+        with self._lock:
+            self._docs = docs
+            self._missing = set()
+            self._loaded_at = time.monotonic()
+        logger.info(f"Restaurant directory loaded {len(docs)} restaurants")
+        return len(docs)
+
+    def _ensure_fresh(self):
+        if not self._loaded_at or time.monotonic() - self._loaded_at > self._refresh_seconds:
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.warning(f"Restaurant directory refresh failed: {e}")
+                self._loaded_at = time.monotonic()
+
+    def _load_missing(self, restaurant_ids: List[str]):
+        try:
+            found = list(self._collection.find({"restaurant_id": {"$in": restaurant_ids}}, {"_id": 0}))
+        except Exception as e:
+            logger.warning(f"Restaurant lookup failed: {e}")
+            return
+        with self._lock:
+            docs = dict(self._docs)
+            docs.update((d["restaurant_id"], d) for d in found)
+            self._missing.update(rid for rid in restaurant_ids if rid not in docs)
+            self._docs = docs
+
+    def get_many(self, restaurant_ids: Iterable[str]) -> List[Dict[str, Any]]:
+        """Resolves ids in order, dropping duplicates and unknown ids."""
+        self._ensure_fresh()
+        ids = list(dict.fromkeys(rid for rid in restaurant_ids if rid))
+        missing = [rid for rid in ids if rid not in self._docs and rid not in self._missing]
+        if missing:
+            self._load_missing(missing)
+        docs = self._docs
+        return [docs[rid] for rid in ids if rid in docs]
+
+    def get(self, restaurant_id: str) -> Optional[Dict[str, Any]]:
+        found = self.get_many([restaurant_id])
+        return found[0] if found else None
+
+    def name(self, restaurant_id: str, default: str = "a local eatery") -> str:
+        doc = self.get(restaurant_id)
+        return doc.get("restaurant_name", default) if doc else default
+
+    def put(self, doc: Dict[str, Any]) -> Dict[str, Any]:
+        clean = {k: v for k, v in doc.items() if k != "_id"}
+        with self._lock:
+            docs = dict(self._docs)
+            docs[clean["restaurant_id"]] = clean
+            self._missing.discard(clean["restaurant_id"])
+            self._docs = docs
+        return clean
+
+    def __len__(self):
+        return len(self._docs)
+
+restaurant_directory = RestaurantDirectory(mongo_db.restaurants, CONFIG["restaurant_refresh_seconds"])
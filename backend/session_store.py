@@ -0,0 +1,110 @@
+import datetime
+import heapq
+import threading
+import time
+import logging
+from typing import Dict, List, Tuple, Optional
+from models import Session
+
+logger = logging.getLogger("session_store")
+
+class SessionStore:
+    """Dialogue session persistence; implementations must make expiry cheaper than a full scan."""
+
+    def get(self, session_id: str) -> Optional[Session]:
+        raise NotImplementedError
+
+    def save(self, session: Session):
+        raise NotImplementedError
+
+    def delete(self, session_id: str):
+        raise NotImplementedError
+
+    def expire(self) -> int:
+        return 0
+
+class MemorySessionStore(SessionStore):
+    """Per-process store with a lazy expiry heap: each save pushes (expires_at, session_id)."""
+
+    def __init__(self, ttl_seconds: int):
+        self.ttl_seconds = ttl_seconds
+        self._sessions: Dict[str, Tuple[Session, float]] = {}
+        self._heap: List[Tuple[float, str]] = []
+        self._lock = threading.Lock()
+
+    def get(self, session_id):
+        with self._lock:
+            entry = self._sessions.get(session_id)
+        if not entry or entry[1] <= time.time():
+            return None
+        return entry[0]
+
+    def save(self, session):
+        expires_at = time.time() + self.ttl_seconds
+        with self._lock:
+            self._sessions[session.session_id] = (session, expires_at)
+            heapq.heappush(self._heap, (expires_at, session.session_id))
+
+    def delete(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def expire(self):
+        now = time.time()
+        removed = 0
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                _, sid = heapq.heappop(self._heap)
+                entry = self._sessions.get(sid)
+                # Older heap entries of a session that was saved again are skipped
+                if entry and entry[1] <= now:
+                    del self._sessions[sid]
+                    removed += 1
+        return removed
+
+    def __len__(self):
+        return len(self._sessions)
+
+class MongoSessionStore(SessionStore):
+    """Shared store for multi-worker deployments; expiry is handled by a Mongo TTL index."""
+
+    def __init__(self, collection, ttl_seconds: int):
+        self.ttl_seconds = ttl_seconds
+        self._col = collection
+        self._indexed = False
+
+    def _ensure_indexes(self):
+        # On first use rather than at import, so importing the app needs no live Mongo
+        if not self._indexed:
+            self._col.create_index("expires_at", expireAfterSeconds=0)
+            self._indexed = True
+
+    def get(self, session_id):
+        # The TTL monitor runs about once a minute, so expiry is re-checked on read
+        doc = self._col.find_one({"_id": session_id, "expires_at": {"$gt": datetime.datetime.utcnow()}})
+        if not doc:
+            return None
+        return Session(session_id=doc["_id"], user_id=doc["u"], dialog_history=doc.get("h", []),
+                       state=doc.get("s", {}), last_activity=doc.get("t") or datetime.datetime.utcnow())
+
+    def save(self, session):
+        self._ensure_indexes()
+        now = datetime.datetime.utcnow()
+        self._col.replace_one({"_id": session.session_id}, {
+            "u": session.user_id,
+            "h": session.dialog_history,
+            "s": session.state,
+            "t": session.last_activity,
+            "expires_at": now + datetime.timedelta(seconds=self.ttl_seconds),
+        }, upsert=True)
+
+    def delete(self, session_id):
+        self._col.delete_one({"_id": session_id})
+
+def make_session_store(backend: str, ttl_seconds: int) -> SessionStore:
+    if backend == "mongo":
+        from config import mongo_db
+        return MongoSessionStore(mongo_db.sessions, ttl_seconds)
+    if backend != "memory":
+        logger.warning(f"Unknown SESSION_BACKEND '{backend}', using in-process sessions")
+    return MemorySessionStore(ttl_seconds)
@@ -0,0 +1,75 @@
+import os
+import json
+import random
+import logging
+import threading
+from typing import Any, Dict
+
+logger = logging.getLogger("traffic_capture")
+
+REDACTED = "<redacted>"
+SENSITIVE_KEYS = {"password", "token", "authorization", "jwt", "secret", "api_key", "email"}
+SKIP_PATHS = {"/api/metrics"}
+
+def sanitize(value: Any) -> Any:
+    """Recursively replaces credentials and personal fields; everything else is kept for replay."""
+    if isinstance(value, dict):
+        return {k: REDACTED if str(k).lower() in SENSITIVE_KEYS else sanitize(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [sanitize(v) for v in value]
+    return value
+
+class TrafficRecorder:
+    """Appends one JSON line per API request to a capture file (opt-in via TRAFFIC_CAPTURE_PATH).
+
+    Lines carry the wall-clock start time, so scripts/replay.py can reproduce the
+    original arrival pattern. Authorization headers are never written; the user id
+    they resolved to is stored instead so replays can act as the same user.
+    """
+
+    def __init__(self, path: str, sample_rate: float = 1.0):
+        self.path = path
+        self.sample_rate = sample_rate
+        self._lock = threading.Lock()
+        self._file = None
+        self._pid = None
+        self.recorded = 0
+
+    def _handle(self):
+        if self._file is None or self._pid != os.getpid():
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._file = open(self.path, "a", encoding="utf-8")
+            self._pid = os.getpid()
+        return self._file
+
+    def should_record(self, path: str) -> bool:
+        if path in SKIP_PATHS:
+            return False
+        return self.sample_rate >= 1.0 or random.random() < self.sample_rate
+
+    def record(self, entry: Dict[str, Any]):
+        line = json.dumps(entry, default=str, separators=(",", ":"))
+        try:
+            with self._lock:
+                f = self._handle()
+                f.write(line + "\n")
+                f.flush()
+                self.recorded += 1
+        except OSError as e:
+            logger.warning(f"Traffic capture write failed: {e}")
+
+def capture_entry(request, response, started_wall: float, duration_ms: float, user_id: str | None) -> Dict[str, Any]:
+    body = request.get_json(silent=True) if request.is_json else None
+    return {
+        "ts": round(started_wall, 6),
+        "method": request.method,
+        "path": request.path,
+        "endpoint": request.url_rule.rule if request.url_rule else None,
+        "query": sanitize(request.args.to_dict()),
+        "body": sanitize(body),
+        "user_id": user_id,
+        "status": response.status_code,
+        "duration_ms": round(duration_ms, 3),
+        # None for streamed responses, whose size is unknown when the hook runs
+        "response_bytes": response.calculate_content_length(),
+    }
@@ -0,0 +1,159 @@
+import math
+import time
+import logging
+import datetime
+import threading
+from collections import defaultdict
+from typing import Dict, Iterable, List, Tuple
+from pymongo import UpdateOne
+from config import mongo_db, CONFIG
+from catalog import food_catalog
+
+logger = logging.getLogger("trending")
+
+GLOBAL_AREA = "*"
+# Forward decay: an event at time t adds w * 2^((t - epoch) / half_life). Relative order never needs
+# recomputing as time passes, so old likes fade without a batch job. The epoch is persisted in
+# mongo_db.trending_meta and moved to "now" by rebuild(); boosts grow by one doubling per half-life,
+# so the maintenance 'trending' task has to run before MAX_DOUBLINGS half-lives have passed.
+MAX_DOUBLINGS = 960
+WARN_DOUBLINGS = 512
+
+def _area_key(area: str | None) -> str:
+    return " ".join(str(area or "").split()).lower()
+
+def _boost(ts: datetime.datetime, epoch: datetime.datetime) -> float:
+    half_life = CONFIG["trending_half_life_hours"] * 3600
+    doublings = (ts - epoch).total_seconds() / half_life
+    # Past the cap newer events stop outranking older ones, but the float never overflows
+    return math.pow(2.0, min(doublings, MAX_DOUBLINGS))
+
+def _event_time(e) -> datetime.datetime:
+    ts = e.get("timestamp")
+    if isinstance(ts, str):
+        return datetime.datetime.fromisoformat(ts)
+    return ts or datetime.datetime.utcnow()
+
+class TrendingBoards:
+    """Per-area top-K leaderboards served from memory, persisted in mongo_db.trending_scores."""
+
+    def __init__(self, collection, meta, top_k: int, refresh_seconds: int):
+        self._col = collection
+        self._meta = meta
+        self._epoch: datetime.datetime | None = None
+        self.top_k = top_k
+        self.refresh_seconds = refresh_seconds
+        self._boards: Dict[str, List[Tuple[str, float]]] = {}
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+        self._indexed = False
+
+    def _ensure_indexes(self):
+        if not self._indexed:
+            self._col.create_index([("area", 1), ("food_id", 1)], unique=True)
+            self._col.create_index([("area", 1), ("score", -1)])
+            self._indexed = True
+
+    def epoch(self) -> datetime.datetime:
+        if self._epoch is None:
+            self._load_epoch()
+        return self._epoch
+
+    def _load_epoch(self):
+        # The first worker to get here sets it; everyone else reads the same value
+        self._meta.update_one({"_id": "epoch"}, {"$setOnInsert": {"epoch": datetime.datetime.utcnow()}}, upsert=True)
+        self._epoch = self._meta.find_one({"_id": "epoch"})["epoch"]
+
+    def refresh(self):
+        """Reloads the top-K of every area; picks up increments (and epoch moves) from other workers."""
+        self._ensure_indexes()
+        self._load_epoch()
+        boards = {}
+        for area in self._col.distinct("area"):
+            cursor = self._col.find({"area": area}, {"food_id": 1, "score": 1}).sort("score", -1).limit(self.top_k)
+            boards[area] = [(d["food_id"], d["score"]) for d in cursor if d["score"] > 0]
+        with self._lock:
+            self._boards = boards
+            self._loaded_at = time.monotonic()
+
+    def _ensure_fresh(self):
+        if time.monotonic() - self._loaded_at > self.refresh_seconds:
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.warning(f"Trending refresh failed: {e}")
+                self._loaded_at = time.monotonic()
+
+    def _matching_areas(self, area: str | None) -> List[str]:
+        key = _area_key(area)
+        if not key:
+            return [GLOBAL_AREA]
+        if key in self._boards:
+            return [key]
+        return [a for a in self._boards if a != GLOBAL_AREA and key in a]
+
+    def top_scored(self, area: str | None, k: int) -> List[Tuple[str, float]]:
+        self._ensure_fresh()
+        with self._lock:
+            areas = self._matching_areas(area)
+            if len(areas) == 1:
+                return self._boards.get(areas[0], [])[:k]
+            merged: Dict[str, float] = {}
+            for a in areas:
+                for fid, score in self._boards[a]:
+                    merged[fid] = max(score, merged.get(fid, 0.0))
+        return sorted(merged.items(), key=lambda kv: kv[1], reverse=True)[:k]
+
+    def top(self, area: str | None, k: int) -> List[str]:
+        return [fid for fid, _ in self.top_scored(area, k)]
+
+    def record(self, events: Iterable[Dict]):
+        """Adds decayed like/dislike weights for each event's area and the global board."""
+        self._ensure_indexes()
+        deltas: Dict[Tuple[str, str], float] = defaultdict(float)
+        epoch = self.epoch()
+        age = (datetime.datetime.utcnow() - epoch).total_seconds() / (CONFIG["trending_half_life_hours"] * 3600)
+        if age > WARN_DOUBLINGS:
+            logger.warning(f"Trending epoch is {age:.0f} half-lives old; run 'scripts/maintenance.py trending'")
+        for e in events:
+            fid = e.get("food_id")
+            if not fid:
+                continue
+            w = (1.0 if e.get("action") == "like" else -1.0) * _boost(_event_time(e), epoch)
+            deltas[(GLOBAL_AREA, fid)] += w
+            food = food_catalog.get(fid)
+            if food and food.popular_in:
+                deltas[(_area_key(food.popular_in), fid)] += w
+        if not deltas:
+            return
+        self._col.bulk_write([UpdateOne({"area": area, "food_id": fid}, {"$inc": {"score": d}}, upsert=True)
+                              for (area, fid), d in deltas.items()], ordered=False)
+        with self._lock:
+            # Apply locally right away; each touched board is re-sorted (at most K + a few entries).
+            # Foods outside the cached top-K start from their delta until the next refresh.
+            touched = defaultdict(dict)
+            for (area, fid), d in deltas.items():
+                touched[area][fid] = d
+            for area, changes in touched.items():
+                board = dict(self._boards.get(area, []))
+                for fid, d in changes.items():
+                    board[fid] = board.get(fid, 0.0) + d
+                ranked = sorted(((f, s) for f, s in board.items() if s > 0), key=lambda x: x[1], reverse=True)
+                self._boards[area] = ranked[:self.top_k]
+
+    def rebuild(self) -> int:
+        """Moves the epoch to now and recomputes all scores from the interactions collection."""
+        events = list(mongo_db.interactions.find({"food_id": {"$ne": None}, "action": {"$in": ["like", "dislike"]}},
+                                                 {"food_id": 1, "action": 1, "timestamp": 1}))
+        self._epoch = datetime.datetime.utcnow()
+        self._meta.update_one({"_id": "epoch"}, {"$set": {"epoch": self._epoch}}, upsert=True)
+        self._col.drop()
+        self._indexed = False
+        with self._lock:
+            self._boards = {}
+        self.record(events)
+        self.refresh()
+        return len(events)
+
+trending_boards = TrendingBoards(mongo_db.trending_scores, mongo_db.trending_meta,
+                                 CONFIG["trending_top_k"], CONFIG["trending_refresh_seconds"])
@@ -0,0 +1,102 @@
+import datetime
+import logging
+import numpy as np
+from collections import defaultdict
+from typing import Dict, List, Tuple, Iterable
+from pymongo import UpdateOne
+from config import mongo_db, qdrant, CONFIG
+from vector_store import food_vector_backend
+
+logger = logging.getLogger("user_vectors")
+
+# Per-user running state lives in mongo_db.user_vectors: {user_id, sum (float32 bytes), updated_at}.
+# The normalized sum is what gets upserted to the Qdrant user_profiles collection.
+
+def action_weight(action: str) -> float:
+    return 1.0 if action == "like" else -CONFIG["user_vector_dislike_weight"]
+
+def _decay(dt_seconds: float) -> float:
+    half_life = CONFIG["user_vector_half_life_days"] * 86400
+    if half_life <= 0 or dt_seconds <= 0:
+        return 1.0
+    return 0.5 ** (dt_seconds / half_life)
+
+def _to_utc(ts) -> datetime.datetime:
+    if isinstance(ts, str):
+        return datetime.datetime.fromisoformat(ts)
+    return ts or datetime.datetime.utcnow()
+
+def apply_feedback_vectors(events: Iterable[Dict]):
+    """Folds like/dislike events into each user's running vector: decay, then add ±w * food vector."""
+    deltas: Dict[str, List[Tuple[str, float, datetime.datetime]]] = defaultdict(list)
+    for e in events:
+        if e.get("food_id"):
+            deltas[e["user_id"]].append((e["food_id"], action_weight(e.get("action")), _to_utc(e.get("timestamp"))))
+    if not deltas:
+        return
+    dim = CONFIG["user_vector_size"]
+    food_vecs = food_vector_backend().get_vectors([fid for items in deltas.values() for fid, _, _ in items])
+    states = {d["user_id"]: d for d in mongo_db.user_vectors.find({"user_id": {"$in": list(deltas)}})}
+
+    now = datetime.datetime.utcnow()
+    sums: Dict[str, np.ndarray] = {}
+    for uid, items in deltas.items():
+        state = states.get(uid)
+        if state:
+            total = np.frombuffer(state["sum"], dtype=np.float32).copy()
+            total *= _decay((now - state["updated_at"]).total_seconds())
+        else:
+            total = np.zeros(dim, dtype=np.float32)
+        for fid, weight, ts in items:
+            vec = food_vecs.get(fid)
+            if vec is not None:
+                total += weight * _decay((now - ts).total_seconds()) * vec
+        sums[uid] = total
+    _store(sums, now)
+
+def rebuild_user_vectors(batch_size: int = 500) -> int:
+    """Recomputes every user's vector from the interactions collection (with time decay)."""
+    now = datetime.datetime.utcnow()
+    events: Dict[str, List[Tuple[str, float, datetime.datetime]]] = defaultdict(list)
+    for e in mongo_db.interactions.find({"food_id": {"$ne": None}, "action": {"$in": ["like", "dislike"]}},
+                                        {"user_id": 1, "food_id": 1, "action": 1, "timestamp": 1}):
+        events[e["user_id"]].append((e["food_id"], action_weight(e["action"]), _to_utc(e.get("timestamp"))))
+    food_vecs = food_vector_backend().get_vectors({fid for items in events.values() for fid, _, _ in items})
+    fids = list(food_vecs)
+    if not fids:
+        return 0
+    row_of = {fid: i for i, fid in enumerate(fids)}
+    matrix = np.stack([food_vecs[fid] for fid in fids])
+
+    users = list(events)
+    for start in range(0, len(users), batch_size):
+        chunk = users[start:start + batch_size]
+        # Sparse user x food weight matrix for the chunk, then one matrix product
+        weights = np.zeros((len(chunk), len(fids)), dtype=np.float32)
+        for i, uid in enumerate(chunk):
+            for fid, w, ts in events[uid]:
+                if fid in row_of:
+                    weights[i, row_of[fid]] += w * _decay((now - ts).total_seconds())
+        sums = weights @ matrix
+        _store(dict(zip(chunk, sums)), now)
+    logger.info(f"Rebuilt vectors for {len(users)} users")
+    return len(users)
+
+def _store(sums: Dict[str, np.ndarray], now: datetime.datetime):
+    mongo_db.user_vectors.bulk_write([
+        UpdateOne({"user_id": uid}, {"$set": {"sum": vec.astype(np.float32).tobytes(), "updated_at": now}}, upsert=True)
+        for uid, vec in sums.items()], ordered=False)
+    from qdrant_client.http import models as qmodels
+    points = []
+    for uid, vec in sums.items():
+        norm = float(np.linalg.norm(vec))
+        if norm == 0:
+            continue
+        points.append(qmodels.PointStruct(id=uid, vector=(vec / norm).tolist(),
+                                          payload={"user_id": uid, "updated_at": now.isoformat()}))
+    if not points:
+        return
+    try:
+        qdrant.upsert(collection_name="user_profiles", points=points)
+    except Exception as e:
+        logger.warning(f"Qdrant user vector upsert failed: {e}")
@@ -4,10 +4,10 @@ import datetime
 import logging
 import numpy as np
 from typing import List, Dict, Any
-from config import get_gemini_embedding, CONFIG, mongo_db, JWT_SECRET
+from config import get_gemini_embedding_vector, JWT_SECRET
+from catalog import food_catalog
 
 logger = logging.getLogger("util")
-_EMBED_CACHE: Dict[str, np.ndarray] = {}
 
 def hash_password(password: str) -> str:
     return hashlib.sha256(password.encode("utf-8")).hexdigest()
@@ -31,12 +31,8 @@ def decode_auth_token(token: str) -> str | None:
         return None
 
 def embed_text_gemini(text: str) -> np.ndarray:
-    if text in _EMBED_CACHE:
-        return _EMBED_CACHE[text]
-    emb_list = get_gemini_embedding(text)
-    vec = np.array(emb_list, dtype=np.float32)
-    _EMBED_CACHE[text] = vec
-    return vec
+    # Cached (LRU + optional SQLite tier) inside config.get_gemini_embedding_vector
+    return get_gemini_embedding_vector(text)
 
 def similarity(vec1, vec2) -> float:
     v1 = np.array(vec1, dtype=np.float32)
@@ -69,11 +65,7 @@ def build_explanation(food: Dict[str, Any], user, context: Dict[str, Any]) -> st
     if context.get("community"):
         parts.append("Community approved")
     if user and getattr(user, "liked_foods", []):
-        names = []
-        for fid in user.liked_foods[:2]:
-            doc = mongo_db.foods.find_one({"food_id": fid}, {"food_name": 1})
-            if doc and doc.get("food_name"):
-                names.append(doc["food_name"])
+        names = [f.food_name for f in food_catalog.get_many(user.liked_foods[:2]) if f.food_name]
         if names:
             parts.append("You liked: " + ", ".join(names))
     return " | ".join([p for p in parts if p])
\ No newline at end of file
@@ -0,0 +1,304 @@
+import os
+import json
+import logging
+import threading
+import numpy as np
+from typing import List, Dict, Any, Tuple, Sequence, Callable
+from attribute_index import AttributeIndex
+
+logger = logging.getLogger("vector_store")
+
+SearchHit = Tuple[Dict[str, Any], float]
+Filters = Dict[str, str] | None
+
+# Enumerated fields are matched exactly (keyword index); free-text fields by word (text index).
+# A word match on veg_nonveg would let "Veg" match "Non-Veg".
+KEYWORD_FIELDS = ["veg_nonveg", "price_level", "dish_type"]
+TEXT_FIELDS = ["category", "popular_in", "spice_level", "cuisine"]
+FILTER_FIELDS = KEYWORD_FIELDS + TEXT_FIELDS
+
+def ensure_food_payload_indexes(client, collection: str = "food_collection"):
+    """Create the filter payload indexes that are missing; indexes of the wrong type are replaced."""
+    from qdrant_client.http import models as qmodels
+    text_params = qmodels.TextIndexParams(type="text", tokenizer=qmodels.TokenizerType.WORD, lowercase=True)
+    wanted = {name: qmodels.PayloadSchemaType.KEYWORD for name in KEYWORD_FIELDS + ["food_id"]}
+    wanted.update({name: qmodels.PayloadSchemaType.TEXT for name in TEXT_FIELDS})
+    existing = client.get_collection(collection_name=collection).payload_schema or {}
+    for field_name, schema in wanted.items():
+        info = existing.get(field_name)
+        if info is not None and info.data_type == schema:
+            continue
+        if info is not None:
+            logger.info(f"Replacing {info.data_type} payload index on {field_name} with {schema}")
+            client.delete_payload_index(collection_name=collection, field_name=field_name)
+        client.create_payload_index(collection_name=collection, field_name=field_name,
+                                    field_schema=text_params if schema == qmodels.PayloadSchemaType.TEXT else schema)
+
+def qdrant_filter(filters: Filters, attributes: AttributeIndex | None = None):
+    """Payload filter for a search. Keyword fields need the stored spelling, which `attributes`
+    resolves the same way the local index matches ("veg" -> "Veg"); without it values are used as given."""
+    if not filters:
+        return None
+    from qdrant_client.http import models as qmodels
+    conditions = []
+    for key, val in filters.items():
+        if not val:
+            continue
+        if key in KEYWORD_FIELDS:
+            values = attributes.raw_values(key, str(val)) if attributes is not None else [str(val)]
+            # Nothing stored resolves to the value: keep it so the filter still matches nothing
+            match = qmodels.MatchAny(any=values) if values else qmodels.MatchValue(value=str(val))
+        else:
+            match = qmodels.MatchText(text=str(val))
+        conditions.append(qmodels.FieldCondition(key=key, match=match))
+    return qmodels.Filter(must=conditions)
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+class VectorBackend:
+    """Food vector search interface shared by the Qdrant and in-process engines."""
+
+    def search(self, vector: Sequence[float], k: int, filters: Filters = None) -> List[SearchHit]:
+        return self.search_batch([vector], k, filters)[0]
+
+    def search_batch(self, vectors: Sequence[Sequence[float]], k: int, filters: Filters = None) -> List[List[SearchHit]]:
+        raise NotImplementedError
+
+    def upsert(self, payloads: List[Dict[str, Any]], vectors: Sequence[Sequence[float]],
+               ids: Sequence[Any] | None = None):
+        raise NotImplementedError
+
+    def get_vectors(self, food_ids: Sequence[str]) -> Dict[str, np.ndarray]:
+        """Stored (unit-normalized) vectors for the given food ids; unknown ids are omitted."""
+        raise NotImplementedError
+
+class QdrantVectorBackend(VectorBackend):
+    def __init__(self, client, collection: str = "food_collection",
+                 attributes: Callable[[], AttributeIndex] | None = None):
+        self._client = client
+        self._collection = collection
+        self._attributes = attributes
+
+    def _filter(self, filters: Filters):
+        if not filters:
+            return None
+        return qdrant_filter(filters, self._attributes() if self._attributes is not None else None)
+
+    def search(self, vector, k, filters=None):
+        results = self._client.search(collection_name=self._collection,
+                                      query_vector=list(map(float, vector)),
+                                      query_filter=self._filter(filters),
+                                      limit=k,
+                                      with_payload=True)
+        return [(r.payload, r.score) for r in results if r.payload]
+
+    def search_batch(self, vectors, k, filters=None):
+        from qdrant_client.http import models as qmodels
+        query_filter = self._filter(filters)
+        requests = [qmodels.SearchRequest(vector=list(map(float, v)), filter=query_filter, limit=k, with_payload=True)
+                    for v in vectors]
+        batches = self._client.search_batch(collection_name=self._collection, requests=requests)
+        return [[(r.payload, r.score) for r in results if r.payload] for results in batches]
+
+    def get_vectors(self, food_ids):
+        from qdrant_client.http import models as qmodels
+        ids = list(dict.fromkeys(food_ids))
+        if not ids:
+            return {}
+        scroll_filter = qmodels.Filter(must=[qmodels.FieldCondition(key="food_id", match=qmodels.MatchAny(any=ids))])
+        vectors, offset = {}, None
+        # A food_id may sit on several points; like the local index, the first one wins
+        while True:
+            points, offset = self._client.scroll(collection_name=self._collection, scroll_filter=scroll_filter,
+                                                 limit=max(len(ids), 64), offset=offset,
+                                                 with_payload=["food_id"], with_vectors=True)
+            for p in points:
+                if p.payload and p.vector:
+                    vectors.setdefault(p.payload["food_id"], np.asarray(p.vector, dtype=np.float32))
+            if offset is None or len(vectors) == len(ids):
+                break
+        return {fid: v / (np.linalg.norm(v) or 1.0) for fid, v in vectors.items()}
+
+class LocalVectorIndex(VectorBackend):
+    """Exact cosine search over a contiguous, L2-normalized float32 matrix held in process.
+
+    Rows are keyed by a per-row id (the Qdrant point id), not by food_id: the catalog
+    repeats food_ids across restaurants and dishes.
+    """
+
+    def __init__(self, dim: int):
+        self.dim = dim
+        self._buf = np.zeros((0, dim), dtype=np.float32)
+        self._size = 0
+        self._keys: List[Any] = []
+        self._payloads: List[Dict[str, Any]] = []
+        self._row_of: Dict[Any, int] = {}
+        self._food_rows: Dict[str, List[int]] = {}
+        self._attributes: AttributeIndex | None = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def _matrix(self) -> np.ndarray:
+        return self._buf[:self._size]
+
+    def _reserve(self, n: int):
+        # Geometric growth keeps row-by-row loading linear; existing views stay valid
+        if n <= len(self._buf):
+            return
+        buf = np.zeros((max(n, 2 * len(self._buf), 64), self.dim), dtype=np.float32)
+        buf[:self._size] = self._buf[:self._size]
+        self._buf = buf
+
+    def upsert(self, payloads, vectors, ids: Sequence[Any] | None = None):
+        """Insert or replace rows by id; without ids every row is appended. Repeated ids: last wins."""
+        vectors = _normalize(np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim))
+        with self._lock:
+            if ids is None:
+                ids = range(self._size, self._size + len(vectors))
+            self._reserve(self._size + len(vectors))
+            size = self._size
+            for key, payload, vec in zip(ids, payloads, vectors):
+                fid = str(payload.get("food_id"))
+                row = self._row_of.get(key)
+                if row is None:
+                    row = self._row_of[key] = size
+                    size += 1
+                    self._keys.append(key)
+                    self._payloads.append(payload)
+                    self._food_rows.setdefault(fid, []).append(row)
+                else:
+                    old = str(self._payloads[row].get("food_id"))
+                    if old != fid:
+                        self._food_rows[old].remove(row)
+                        if not self._food_rows[old]:
+                            del self._food_rows[old]
+                        self._food_rows.setdefault(fid, []).append(row)
+                    self._payloads[row] = payload
+                self._buf[row] = vec
+            self._size = size
+            self._attributes = None
+
+    def get_vectors(self, food_ids):
+        """A food_id stored on several rows resolves to its first row."""
+        with self._lock:
+            matrix, food_rows = self._matrix, self._food_rows
+            return {fid: matrix[food_rows[fid][0]] for fid in food_ids if fid in food_rows}
+
+    def snapshot(self) -> Tuple[np.ndarray, List[Dict[str, Any]]]:
+        """Consistent (normalized matrix, payloads) pair for bulk jobs; treat both as read-only."""
+        with self._lock:
+            return self._matrix, self._payloads[:self._size]
+
+    def _attributes_locked(self) -> AttributeIndex:
+        if self._attributes is None:
+            self._attributes = AttributeIndex.from_payloads(self._payloads)
+        return self._attributes
+
+    def attributes(self) -> AttributeIndex:
+        """Bitmap index over the payload rows, rebuilt lazily after upserts."""
+        with self._lock:
+            return self._attributes_locked()
+
+    def filter_mask(self, filters: Filters) -> np.ndarray | None:
+        """Rows matching every filter (normalized value match, see AttributeIndex.term)."""
+        if not filters:
+            return None
+        return self.attributes().select(filters, known_only=False)
+
+    def search_batch(self, vectors, k, filters=None):
+        with self._lock:
+            matrix, payloads = self._matrix, self._payloads
+            index = self._attributes_locked() if filters else None
+        queries = _normalize(np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim))
+        mask = index.select(filters, known_only=False) if index is not None else None
+        k = min(k, len(matrix) if mask is None else int(mask.sum()))
+        if k <= 0:
+            return [[] for _ in range(len(queries))]
+        scores = queries @ matrix.T
+        if mask is not None:
+            scores[:, ~mask] = -np.inf
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        top = np.take_along_axis(top, order, axis=1)
+        top_scores = np.take_along_axis(top_scores, order, axis=1)
+        return [[(payloads[i], float(s)) for i, s in zip(rows, row_scores)]
+                for rows, row_scores in zip(top, top_scores)]
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = path + ".tmp.npz"
+        with self._lock:
+            matrix, keys, payloads = self._matrix, self._keys[:self._size], self._payloads[:self._size]
+        np.savez(tmp, matrix=matrix, keys=np.array([json.dumps(k) for k in keys]),
+                 payloads=np.array([json.dumps(p) for p in payloads]))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> "LocalVectorIndex":
+        data = np.load(path)
+        matrix = data["matrix"]
+        index = cls(matrix.shape[1])
+        # Files written before per-row keys fall back to row order
+        keys = [json.loads(k) for k in data["keys"]] if "keys" in data.files else None
+        index.upsert([json.loads(p) for p in data["payloads"]], matrix, ids=keys)
+        return index
+
+    @classmethod
+    def from_qdrant(cls, client, collection: str, dim: int, batch_size: int = 256) -> "LocalVectorIndex":
+        index = cls(dim)
+        offset = None
+        while True:
+            points, offset = client.scroll(collection_name=collection, limit=batch_size, offset=offset,
+                                           with_payload=True, with_vectors=True)
+            points = [p for p in points if p.payload and p.vector]
+            if points:
+                index.upsert([p.payload for p in points], [p.vector for p in points], ids=[p.id for p in points])
+            if offset is None:
+                break
+        return index
+
+def build_local_food_index(client, path: str, dim: int, rebuild: bool = False) -> LocalVectorIndex:
+    if os.path.exists(path) and not rebuild:
+        index = LocalVectorIndex.load(path)
+        logger.info(f"Local food index loaded from {path} ({len(index)} vectors)")
+        return index
+    index = LocalVectorIndex.from_qdrant(client, "food_collection", dim)
+    index.save(path)
+    logger.info(f"Local food index built from Qdrant ({len(index)} vectors) -> {path}")
+    return index
+
+def food_matrix() -> Tuple[np.ndarray, List[Dict[str, Any]]]:
+    """Normalized food vectors and payloads for bulk jobs (scrolls Qdrant unless the local index is active)."""
+    backend = food_vector_backend()
+    if not isinstance(backend, LocalVectorIndex):
+        from config import qdrant, CONFIG
+        backend = LocalVectorIndex.from_qdrant(qdrant, "food_collection", CONFIG["food_vector_size"])
+    return backend.snapshot()
+
+_food_backend: VectorBackend | None = None
+_food_backend_lock = threading.Lock()
+
+def set_food_vector_backend(backend: VectorBackend):
+    global _food_backend
+    _food_backend = backend
+
+def food_vector_backend() -> VectorBackend:
+    global _food_backend
+    if _food_backend is None:
+        with _food_backend_lock:
+            if _food_backend is None:
+                from config import qdrant, CONFIG, VECTOR_BACKEND, LOCAL_VECTOR_PATH
+                if VECTOR_BACKEND == "local":
+                    _food_backend = build_local_food_index(qdrant, LOCAL_VECTOR_PATH, CONFIG["food_vector_size"])
+                else:
+                    from catalog import food_catalog
+                    _food_backend = QdrantVectorBackend(qdrant, "food_collection", attributes=food_catalog.attributes)
+    return _food_backend
@@ -0,0 +1,359 @@
+"""Offline latency/throughput benchmark for the main API endpoints.
+
+Everything runs in-process against local stand-ins, so no credentials or network are needed:
+  - Mongo: mongomock (pip install mongomock)
+  - Qdrant: in-memory client loaded from data/food.csv
+  - Neo4j: a no-op driver that only counts writes
+  - Gemini / Groq: deterministic fakes with configurable latency (Groq is a local HTTP server,
+    so the real connection pool and timeouts are exercised)
+
+Usage: python scripts/benchmark.py --concurrency 1,4,16 --requests 200 --out bench.json
+"""
+import os
+import sys
+import csv
+import json
+import time
+import uuid
+import hashlib
+import argparse
+import datetime
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+DATA_DIR = ROOT / "data"
+sys.path.insert(0, str(ROOT / "backend"))
+
+ENDPOINTS = ["chat", "recommend_food", "feedback", "recommend_restaurants"]
+CHAT_SCRIPT = ["Suggest something for dinner", "medium", "South Indian", "Gandhipuram", "Veg"]
+QUERIES = ["spicy chicken", "paneer", "fried rice", "something sweet", "biryani", "dosa", "noodles", "soup"]
+
+class CallCounter:
+    """Thread-safe per-service call counts; nested calls (e.g. find_one -> find) count once."""
+
+    def __init__(self):
+        self._counts: Counter = Counter()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def wrap(self, owner, names, service):
+        for name in names:
+            original = getattr(owner, name, None)
+            if original is None:
+                continue
+            setattr(owner, name, self._counted(original, service))
+
+    def _counted(self, fn, service):
+        counter = self
+
+        def wrapper(*args, **kwargs):
+            depth = getattr(counter._local, service, 0)
+            if depth == 0:
+                with counter._lock:
+                    counter._counts[service] += 1
+            setattr(counter._local, service, depth + 1)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                setattr(counter._local, service, depth)
+        return wrapper
+
+    def add(self, service, n=1):
+        with self._lock:
+            self._counts[service] += n
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._counts)
+
+def fake_vector(text: str, dim: int = 768):
+    seed = int(hashlib.md5(text.encode("utf-8")).hexdigest()[:8], 16)
+    return np.random.default_rng(seed).normal(size=dim).astype(np.float32).tolist()
+
+def start_fake_groq(latency_ms: float, counter: CallCounter):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            counter.add("llm")
+            time.sleep(latency_ms / 1000.0)
+            text = "You might enjoy this dish, it matches what you asked for."
+            if body.get("stream"):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                for token in text.split(" "):
+                    chunk = {"choices": [{"delta": {"content": token + " "}}]}
+                    self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.close_connection = True
+                return
+            out = json.dumps({"choices": [{"message": {"content": text}}]}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(out)))
+            self.end_headers()
+            self.wfile.write(out)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}/openai/v1/chat/completions"
+
+def install_stand_ins(args, counter: CallCounter):
+    """Patches the SDK entry points config.py uses; must run before any backend import."""
+    try:
+        import mongomock
+    except ImportError:
+        sys.exit("The benchmark needs mongomock: pip install mongomock")
+    import pymongo
+    import qdrant_client
+    import neo4j
+    import google.generativeai as genai
+
+    os.environ.update({
+        "MONGODB_URI": "mongodb://benchmark", "QDRANT_URL": "http://benchmark", "QDRANT_API_KEY": "benchmark",
+        "NEO4J_URI": "bolt://benchmark", "NEO4J_USER": "benchmark", "NEO4J_PASS": "benchmark",
+        "GEMINI_API_KEY": "benchmark", "GROQ_API_KEY": "benchmark", "JWT_SECRET": "benchmark",
+        "GROQ_URL": start_fake_groq(args.llm_latency_ms, counter),
+        "EMBED_CACHE_PATH": "", "VECTOR_BACKEND": args.vector_backend,
+        "LOCAL_VECTOR_PATH": str(ROOT / ".cache" / "benchmark_vectors.npz"),
+    })
+
+    counter.wrap(mongomock.collection.Collection,
+                 ["find", "find_one", "insert_one", "insert_many", "update_one", "update_many", "replace_one",
+                  "delete_one", "delete_many", "bulk_write", "count_documents", "aggregate", "distinct",
+                  "find_one_and_update", "find_one_and_delete", "create_index"], "mongo")
+    pymongo.MongoClient = mongomock.MongoClient
+
+    in_memory = qdrant_client.QdrantClient(":memory:")
+    counter.wrap(in_memory, ["search", "search_batch", "upsert", "scroll", "retrieve"], "vector")
+    qdrant_client.QdrantClient = lambda *a, **kw: in_memory
+
+    class FakeResult(list):
+        def consume(self):
+            return None
+
+    class FakeTx:
+        def run(self, query, **params):
+            counter.add("neo4j")
+            return FakeResult()
+
+    class FakeSession:
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            return False
+
+        def execute_write(self, fn, *a, **kw):
+            return fn(FakeTx(), *a, **kw)
+
+        def run(self, query, **params):
+            counter.add("neo4j")
+            return FakeResult()
+
+    class FakeDriver:
+        def session(self, **kw):
+            return FakeSession()
+
+        def verify_connectivity(self):
+            return None
+
+    neo4j.GraphDatabase.driver = staticmethod(lambda *a, **kw: FakeDriver())
+
+    def fake_embed(model, content, **kw):
+        counter.add("embed")
+        time.sleep(args.embed_latency_ms / 1000.0)
+        if isinstance(content, list):
+            return {"embedding": [fake_vector(t) for t in content]}
+        return {"embedding": fake_vector(content)}
+
+    genai.embed_content = fake_embed
+
+def load_data(n_users: int, rng):
+    """Loads food.csv/restaurant.csv unchanged into the stand-ins and creates benchmark users with a few likes."""
+    import config
+    from qdrant_client.http import models as qmodels
+
+    with open(DATA_DIR / "food.csv", newline="", encoding="utf-8") as f:
+        foods = list(csv.DictReader(f))
+    with open(DATA_DIR / "restaurant.csv", newline="", encoding="utf-8") as f:
+        restaurants = list(csv.DictReader(f))
+
+    db = config.mongo_db
+    db.foods.insert_many([dict(r) for r in foods])
+    db.restaurants.insert_many([dict(r) for r in restaurants])
+    config.warmup()
+    config.qdrant.upsert("food_collection", points=[
+        qmodels.PointStruct(id=i, vector=fake_vector(f"{r['food_name']} {r['description']}"), payload=dict(r))
+        for i, r in enumerate(foods)])
+
+    if config.VECTOR_BACKEND == "local":
+        # warmup() built the local index from the still-empty collection; rebuild it from the loaded points
+        from vector_store import build_local_food_index, set_food_vector_backend
+        set_food_vector_backend(build_local_food_index(config.qdrant, config.LOCAL_VECTOR_PATH,
+                                                       config.CONFIG["food_vector_size"], rebuild=True))
+
+    # food.csv is loaded as-is: its food_ids repeat across rows
+    food_ids = list(dict.fromkeys(r["food_id"] for r in foods))
+    users = []
+    for i in range(n_users):
+        uid = str(uuid.uuid4())
+        liked = [food_ids[j] for j in rng.choice(len(food_ids), size=5, replace=False)]
+        db.users.insert_one({"user_id": uid, "email": f"bench{i}@example.com", "password_hash": "",
+                             "liked_foods": liked, "disliked_foods": [], "preferences": {}})
+        users.append(uid)
+    return users, food_ids
+
+def make_requests(users, food_ids):
+    local = threading.local()
+
+    def chat(client, i):
+        # Each worker thread walks its own conversation so sessions are never shared between threads
+        if not hasattr(local, "turn"):
+            local.turn, local.user = 0, users[i % len(users)]
+        if local.turn % len(CHAT_SCRIPT) == 0:
+            local.session = f"bench-{uuid.uuid4().hex}"
+        message = CHAT_SCRIPT[local.turn % len(CHAT_SCRIPT)]
+        local.turn += 1
+        return client.post("/api/chat", json={"user_id": local.user, "session_id": local.session, "message": message})
+
+    def recommend_food(client, i):
+        return client.post("/api/recommend_food", json={"user_id": users[i % len(users)],
+                                                        "query": QUERIES[i % len(QUERIES)], "filters": {}})
+
+    def feedback(client, i):
+        return client.post("/api/feedback", json={"user_id": users[i % len(users)],
+                                                  "food_id": food_ids[(i * 7) % len(food_ids)],
+                                                  "action": "like" if i % 4 else "dislike"})
+
+    def recommend_restaurants(client, i):
+        return client.get("/api/recommend_restaurants", query_string={"user_id": users[i % len(users)]})
+
+    return {"chat": chat, "recommend_food": recommend_food, "feedback": feedback,
+            "recommend_restaurants": recommend_restaurants}
+
+def percentile(sorted_ms, q):
+    if not sorted_ms:
+        return 0.0
+    idx = min(len(sorted_ms) - 1, max(0, int(round(q / 100.0 * len(sorted_ms))) - 1))
+    return sorted_ms[idx]
+
+def run_level(app, request_fn, concurrency: int, n_requests: int):
+    local = threading.local()
+    latencies, errors = [], Counter()
+    lock = threading.Lock()
+
+    def one(i):
+        if not hasattr(local, "client"):
+            local.client = app.test_client()
+        started = time.perf_counter()
+        try:
+            resp = request_fn(local.client, i)
+            resp.get_data()
+            status = resp.status_code
+        except Exception as e:
+            status = type(e).__name__
+        elapsed = (time.perf_counter() - started) * 1000.0
+        with lock:
+            latencies.append(elapsed)
+            if status != 200:
+                errors[str(status)] += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(n_requests)))
+    wall = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "requests": n_requests,
+        "errors": dict(errors),
+        "wall_seconds": round(wall, 3),
+        "rps": round(n_requests / wall, 1) if wall else 0.0,
+        "latency_ms": {"mean": round(sum(latencies) / len(latencies), 2),
+                       "p50": round(percentile(latencies, 50), 2),
+                       "p95": round(percentile(latencies, 95), 2),
+                       "p99": round(percentile(latencies, 99), 2),
+                       "max": round(latencies[-1], 2)},
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline API benchmark with local stand-ins.")
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS))
+    parser.add_argument("--concurrency", default="1,4,16")
+    parser.add_argument("--requests", type=int, default=200, help="requests per endpoint per concurrency level")
+    parser.add_argument("--warmup-requests", type=int, default=20)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--llm-latency-ms", type=float, default=300.0)
+    parser.add_argument("--embed-latency-ms", type=float, default=60.0)
+    parser.add_argument("--vector-backend", choices=["qdrant", "local"], default="qdrant")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--out", default="benchmark-results.json")
+    args = parser.parse_args()
+
+    endpoints = [e.strip() for e in args.endpoints.split(",") if e.strip()]
+    unknown = set(endpoints) - set(ENDPOINTS)
+    if unknown:
+        parser.error(f"unknown endpoints: {', '.join(sorted(unknown))}")
+    levels = [int(c) for c in args.concurrency.split(",")]
+
+    counter = CallCounter()
+    install_stand_ins(args, counter)
+    import logging
+    logging.disable(logging.WARNING)
+
+    users, food_ids = load_data(args.users, np.random.default_rng(args.seed))
+    from app import app
+    from feedback import flush_feedback
+    requests_by_name = make_requests(users, food_ids)
+
+    results = []
+    for name in endpoints:
+        request_fn = requests_by_name[name]
+        run_level(app, request_fn, 1, args.warmup_requests)
+        flush_feedback()
+        for concurrency in levels:
+            before = counter.snapshot()
+            result = run_level(app, request_fn, concurrency, args.requests)
+            # Write-behind feedback is applied off-thread; include it in this level's call counts
+            flush_feedback()
+            after = counter.snapshot()
+            calls = {svc: after.get(svc, 0) - before.get(svc, 0) for svc in ("mongo", "vector", "llm", "embed", "neo4j")}
+            result.update({
+                "endpoint": name,
+                "concurrency": concurrency,
+                "calls": calls,
+                "calls_per_request": {svc: round(n / args.requests, 2) for svc, n in calls.items()},
+            })
+            results.append(result)
+            lat = result["latency_ms"]
+            print(f"{name:<22} c={concurrency:<3} {result['rps']:>8.1f} rps  p50 {lat['p50']:>8.1f}  "
+                  f"p95 {lat['p95']:>8.1f}  p99 {lat['p99']:>8.1f} ms  "
+                  f"calls/req mongo {result['calls_per_request']['mongo']:.1f} "
+                  f"vector {result['calls_per_request']['vector']:.2f} llm {result['calls_per_request']['llm']:.2f}"
+                  + (f"  errors {result['errors']}" if result["errors"] else ""))
+
+    report = {
+        "started_at": datetime.datetime.utcnow().isoformat(),
+        "settings": {k: v for k, v in vars(args).items() if k != "out"},
+        "python": sys.version.split()[0],
+        "results": results,
+    }
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {args.out}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Fails when importing a backend module takes longer than the cold-start budget.
+
+Usage: python scripts/check_import_time.py [--module app] [--budget-ms 800] [--runs 3]
+"""
+import os
+import re
+import sys
+import argparse
+import subprocess
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+# Placeholders so the check runs without real credentials; nothing may connect at import time.
+PLACEHOLDER_ENV = {
+    "MONGODB_URI": "mongodb://127.0.0.1:27017",
+    "QDRANT_URL": "http://127.0.0.1:6333",
+    "QDRANT_API_KEY": "placeholder",
+    "NEO4J_URI": "bolt://127.0.0.1:7687",
+    "NEO4J_USER": "placeholder",
+    "NEO4J_PASS": "placeholder",
+    "GEMINI_API_KEY": "placeholder",
+    "GROQ_API_KEY": "placeholder",
+    "GROQ_URL": "http://127.0.0.1:9",
+    "JWT_SECRET": "placeholder",
+}
+
+def measure(module: str):
+    env = dict(os.environ)
+    for key, value in PLACEHOLDER_ENV.items():
+        env.setdefault(key, value)
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          cwd=BACKEND_DIR, env=env, capture_output=True, text=True, timeout=120)
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr[-2000:]}")
+    total_us, modules = 0, {}
+    for line in proc.stderr.splitlines():
+        m = LINE.match(line)
+        if not m:
+            continue
+        cumulative, depth, name = int(m.group(2)), len(m.group(3)), m.group(4)
+        modules[name] = cumulative
+        if depth == 1:
+            total_us += cumulative
+    return total_us / 1000.0, modules
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--module", default="app")
+    parser.add_argument("--budget-ms", type=float, default=float(os.getenv("IMPORT_BUDGET_MS", "800")))
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    # Best of N: the minimum is the least noisy estimate of the real import cost
+    runs = [measure(args.module) for _ in range(args.runs)]
+    total_ms, modules = min(runs, key=lambda r: r[0])
+    print(f"import {args.module}: {total_ms:.0f} ms (best of {args.runs}, budget {args.budget_ms:.0f} ms)")
+    print("Slowest modules (cumulative):")
+    for name, us in sorted(modules.items(), key=lambda kv: kv[1], reverse=True)[:args.top]:
+        print(f"  {us / 1000:8.1f} ms  {name}")
+    for heavy in ("google.generativeai", "neo4j", "qdrant_client"):
+        if heavy in modules:
+            print(f"WARNING: {heavy} is imported eagerly")
+    if total_ms > args.budget_ms:
+        print("FAIL: import time over budget")
+        sys.exit(1)
+    print("OK")
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,10 @@
 import sys
 import os
+import time
 import pandas as pd
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from tqdm import tqdm
+from qdrant_client.http import models as qmodels
 from pathlib import Path
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
@@ -9,14 +12,27 @@ backend_path = str(Path(__file__).resolve().parent.parent / "backend")
 if backend_path not in sys.path:
     sys.path.append(backend_path)
 
-from backend.config import mongo_db, qdrant, neo4j_driver, CONFIG
-from backend.util import mongo_batch_insert, embed_text_gemini
+from backend.config import mongo_db, qdrant, neo4j_driver, CONFIG, LOCAL_VECTOR_PATH, get_gemini_embeddings
+from backend.util import mongo_batch_insert
+from backend.vector_store import LocalVectorIndex, ensure_food_payload_indexes
 from backend.models import Food, Restaurant
 
 DATA_DIR = Path(__file__).resolve().parent.parent / "data"
 FOOD_CSV_PATH = DATA_DIR / "food.csv"
 REST_CSV_PATH = DATA_DIR / "restaurant.csv"
 
+EMBED_BATCH_SIZE = int(os.getenv("ETL_EMBED_BATCH_SIZE", "64"))
+EMBED_WORKERS = int(os.getenv("ETL_EMBED_WORKERS", "4"))
+ETL_RETRIES = int(os.getenv("ETL_RETRIES", "4"))
+NEO4J_BATCH_SIZE = int(os.getenv("NEO4J_BATCH_SIZE", "1000"))
+
+NEO4J_SCHEMA = [
+    "CREATE CONSTRAINT food_id_unique IF NOT EXISTS FOR (f:Food) REQUIRE f.food_id IS UNIQUE",
+    "CREATE CONSTRAINT restaurant_id_unique IF NOT EXISTS FOR (r:Restaurant) REQUIRE r.restaurant_id IS UNIQUE",
+    "CREATE CONSTRAINT user_id_unique IF NOT EXISTS FOR (u:User) REQUIRE u.user_id IS UNIQUE",
+    "CREATE INDEX attribute_name_value IF NOT EXISTS FOR (a:Attribute) ON (a.name, a.value)",
+]
+
 if not FOOD_CSV_PATH.exists():
     raise FileNotFoundError(f"food.csv not found at {FOOD_CSV_PATH}")
 if not REST_CSV_PATH.exists():
@@ -74,27 +90,50 @@ def qdrant_bootstrap():
         collection_name=collection,
         vectors_config={"size": CONFIG['food_vector_size'], "distance": "Cosine"}
     )
-    points = []
-    for i, row in tqdm(enumerate(food_df.to_dict("records")), total=len(food_df)):
-        prompt = f"{row['food_name']} | {row.get('description','')} | {row.get('category','')} | {row.get('veg_nonveg','')} | {row.get('ingredients','')}"
-        emb = embed_text_gemini(prompt)
-        points.append({
-            "id": i,
-            "vector": emb.tolist(),
-            "payload": {**row}
-        })
-        if len(points) == 32:
-            try:
-                qdrant.upsert(collection_name=collection, points=points)
-            except Exception as e:
-                print(f"Upsert batch failed (skipped): {e}")
-            points = []
-    if points:
+    ensure_food_payload_indexes(qdrant, collection)
+    rows = food_df.to_dict("records")
+    batches = [(start, rows[start:start + EMBED_BATCH_SIZE]) for start in range(0, len(rows), EMBED_BATCH_SIZE)]
+    local_index = LocalVectorIndex(CONFIG['food_vector_size'])
+    started = time.perf_counter()
+    # Embedding batches run on a bounded pool; a single upsert worker drains them as they complete
+    with ThreadPoolExecutor(max_workers=EMBED_WORKERS) as embed_pool, \
+            ThreadPoolExecutor(max_workers=1) as upsert_pool, \
+            tqdm(total=len(rows), unit="row") as bar:
+        embed_futures = {embed_pool.submit(_with_retries, _embed_batch, batch, what=f"Embedding batch {start}"): (start, batch)
+                         for start, batch in batches}
+        upserts = []
+        for fut in as_completed(embed_futures):
+            start, batch = embed_futures[fut]
+            vectors = fut.result()
+            local_index.upsert(batch, vectors, ids=range(start, start + len(batch)))
+            points = [qmodels.PointStruct(id=start + j, vector=vec.tolist(), payload={**row})
+                      for j, (row, vec) in enumerate(zip(batch, vectors))]
+            upserts.append(upsert_pool.submit(_with_retries, qdrant.upsert, collection_name=collection,
+                                              points=points, what=f"Upsert batch {start}"))
+            bar.update(len(batch))
+        for fut in upserts:
+            fut.result()
+    elapsed = max(time.perf_counter() - started, 1e-9)
+    local_index.save(LOCAL_VECTOR_PATH)
+    print(f"Qdrant: {len(rows)} embeddings loaded in {elapsed:.1f}s ({len(rows) / elapsed:.1f} rows/s), "
+          f"local index saved to {LOCAL_VECTOR_PATH}.")
+
+def _food_prompt(row) -> str:
+    return f"{row['food_name']} | {row.get('description','')} | {row.get('category','')} | {row.get('veg_nonveg','')} | {row.get('ingredients','')}"
+
+def _embed_batch(batch):
+    return get_gemini_embeddings([_food_prompt(row) for row in batch])
+
+def _with_retries(fn, *args, what: str = "ETL step", **kwargs):
+    for attempt in range(1, ETL_RETRIES + 1):
         try:
-            qdrant.upsert(collection_name=collection, points=points)
+            return fn(*args, **kwargs)
         except Exception as e:
-            print(f"Final upsert batch failed (skipped): {e}")
-    print("Qdrant: Embeddings loaded.")
+            if attempt == ETL_RETRIES:
+                raise RuntimeError(f"{what} failed after {ETL_RETRIES} attempts: {e}") from e
+            delay = 0.5 * 2 ** (attempt - 1)
+            print(f"{what} failed ({e}), retrying in {delay:.1f}s")
+            time.sleep(delay)
 
 def qdrant_user_profiles_bootstrap():
     print("Qdrant: Creating user_profiles collection…")
@@ -111,51 +150,58 @@ def qdrant_user_profiles_bootstrap():
 
 def neo4j_bootstrap():
     print("Neo4j: Rebuilding graph…")
+    foods = [{"food_id": str(r["food_id"]), "food_name": r["food_name"], "category": r["category"],
+              "veg_nonveg": r["veg_nonveg"], "dish_type": r["dish_type"], "restaurant_id": str(r["restaurant_id"])}
+             for r in food_df.to_dict("records")]
+    rests = [{"restaurant_id": str(r["restaurant_id"]), "restaurant_name": r["restaurant_name"], "area": r["address"]}
+             for r in rest_df.to_dict("records")]
+    users = [{"user_id": u.get("user_id"), "email": u.get("email", "")}
+             for u in mongo_db.users.find({}, {"user_id": 1, "email": 1}) if u.get("user_id")]
+    serves = [{"rid": f["restaurant_id"], "fid": f["food_id"]} for f in foods]
+    attrs = [{"attr": attr, "val": f[attr], "fid": f["food_id"]}
+             for f in foods for attr in ["veg_nonveg", "category", "dish_type"] if f.get(attr)]
+
     with neo4j_driver.session() as session:
-        session.run("MATCH (n) DETACH DELETE n")
-        for _, row in tqdm(food_df.iterrows(), total=len(food_df)):
-            f = Food(**row.to_dict())
-            session.run("""
-                MERGE (f:Food {
-                    food_id:$food_id,
-                    food_name:$food_name,
-                    category:$category,
-                    veg_nonveg:$veg_nonveg,
-                    dish_type:$dish_type
-                })
-            """, **f.to_dict())
-        for _, row in tqdm(rest_df.iterrows(), total=len(rest_df)):
-            r = Restaurant(**row.to_dict())
-            session.run("""
-                MERGE (r:Restaurant {
-                    restaurant_id:$restaurant_id,
-                    restaurant_name:$restaurant_name,
-                    area:$address
-                })
-            """, **r.to_dict())
-        existing_users = mongo_db.users.find({})
-        for udoc in existing_users:
-            uid = udoc.get("user_id")
-            session.run("MERGE (u:User {user_id:$uid, email:$email})", uid=uid, email=udoc.get("email", ""))
-
-        for _, frow in tqdm(food_df.iterrows(), total=len(food_df)):
-            fdict = frow.to_dict()
-            session.run("""
-                MATCH (rest:Restaurant {restaurant_id:$rid})
-                MATCH (food:Food {food_id:$fid})
-                MERGE (rest)-[:SERVES]->(food)
-            """, rid=str(fdict["restaurant_id"]), fid=str(fdict["food_id"]))
-            for attr in ["veg_nonveg", "category", "dish_type"]:
-                val = fdict.get(attr)
-                if val:
-                    session.run("""
-                        MERGE (a:Attribute {name:$attr, value:$val})
-                        WITH a
-                        MATCH (f:Food {food_id:$fid})
-                        MERGE (f)-[:HAS_ATTRIBUTE]->(a)
-                    """, attr=attr, val=val, fid=str(fdict["food_id"]))
+        session.run("MATCH (n) CALL { WITH n DETACH DELETE n } IN TRANSACTIONS OF 10000 ROWS").consume()
+        for stmt in NEO4J_SCHEMA:
+            session.run(stmt).consume()
+        _neo4j_unwind(session, "Food", foods, """
+            UNWIND $rows AS row
+            MERGE (f:Food {food_id: row.food_id})
+            SET f.food_name = row.food_name, f.category = row.category,
+                f.veg_nonveg = row.veg_nonveg, f.dish_type = row.dish_type
+        """)
+        _neo4j_unwind(session, "Restaurant", rests, """
+            UNWIND $rows AS row
+            MERGE (r:Restaurant {restaurant_id: row.restaurant_id})
+            SET r.restaurant_name = row.restaurant_name, r.area = row.area
+        """)
+        _neo4j_unwind(session, "User", users, """
+            UNWIND $rows AS row
+            MERGE (u:User {user_id: row.user_id})
+            SET u.email = row.email
+        """)
+        _neo4j_unwind(session, "SERVES", serves, """
+            UNWIND $rows AS row
+            MATCH (rest:Restaurant {restaurant_id: row.rid})
+            MATCH (food:Food {food_id: row.fid})
+            MERGE (rest)-[:SERVES]->(food)
+        """)
+        _neo4j_unwind(session, "HAS_ATTRIBUTE", attrs, """
+            UNWIND $rows AS row
+            MERGE (a:Attribute {name: row.attr, value: row.val})
+            WITH a, row
+            MATCH (f:Food {food_id: row.fid})
+            MERGE (f)-[:HAS_ATTRIBUTE]->(a)
+        """)
     print("Neo4j: Bootstrap complete.")
 
+def _neo4j_unwind(session, label: str, rows, query: str):
+    for start in tqdm(range(0, len(rows), NEO4J_BATCH_SIZE), desc=f"Neo4j {label}", unit="batch"):
+        batch = rows[start:start + NEO4J_BATCH_SIZE]
+        _with_retries(session.execute_write, lambda tx, b=batch: tx.run(query, rows=b).consume(),
+                      what=f"Neo4j {label} batch {start}")
+
 def main():
     print("\n🚀 Starting ETL bootstrapping pipeline…")
     mongo_bootstrap()
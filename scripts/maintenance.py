@@ -0,0 +1,78 @@
+import sys
+import os
+import time
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+backend_path = str(Path(__file__).resolve().parent.parent / "backend")
+if backend_path not in sys.path:
+    sys.path.append(backend_path)
+
+def rebuild_user_vectors():
+    from backend.user_vectors import rebuild_user_vectors as rebuild
+    return f"{rebuild()} users"
+
+def rebuild_trending():
+    from backend.trending import trending_boards
+    return f"{trending_boards.rebuild()} interactions"
+
+def rebuild_community():
+    from backend.community import community_set
+    return f"{community_set.rebuild()} approved suggestions"
+
+def precompute():
+    from backend.precompute import precompute_recommendations
+    return f"{precompute_recommendations()} users"
+
+def precompute_stale():
+    from backend.precompute import precompute_recommendations
+    return f"{precompute_recommendations(stale_only=True)} users"
+
+def item_neighbors():
+    from backend.item_neighbors import item_neighbors as table
+    return f"{table.rebuild()} foods"
+
+def item_cooccurrence():
+    from backend.item_neighbors import item_neighbors as table
+    return f"{table.rebuild_cooccurrence()} foods"
+
+def train_mf():
+    from backend.mf import mf_model
+    stats = mf_model.train()
+    return f"{stats['users']} users x {stats['items']} foods, {stats['nnz']} interactions"
+
+def mf_fold_in():
+    from backend.mf import mf_model
+    return f"{mf_model.fold_in_users()} new users"
+
+def warmup():
+    from backend.config import warmup as run_warmup
+    run_warmup()
+    return "services ready"
+
+TASKS = {
+    "user-vectors": rebuild_user_vectors,
+    "trending": rebuild_trending,
+    "community": rebuild_community,
+    "precompute": precompute,
+    "precompute-stale": precompute_stale,
+    "item-neighbors": item_neighbors,
+    "item-cooccurrence": item_cooccurrence,
+    "train-mf": train_mf,
+    "mf-fold-in": mf_fold_in,
+    "warmup": warmup,
+}
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild derived recommender state or warm up services.")
+    parser.add_argument("tasks", nargs="+", choices=sorted(TASKS))
+    args = parser.parse_args()
+    for name in args.tasks:
+        print(f"{name}: running…")
+        started = time.perf_counter()
+        result = TASKS[name]()
+        print(f"{name}: done ({result}) in {time.perf_counter() - started:.1f}s.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+"""Replays a traffic capture (TRAFFIC_CAPTURE_PATH JSONL) against the API and reports latencies.
+
+Targets:
+  --target http://localhost:8000   a running server
+  --in-process                     the Flask app in this process, on the offline stand-ins
+                                   from scripts/benchmark.py (no services needed)
+
+Speed: --speed 1 keeps the captured arrival times, --speed 5 compresses gaps 5x, --speed max
+sends as fast as --concurrency allows.
+
+Usage: python scripts/replay.py capture.jsonl --target http://localhost:8000 --speed 4 --concurrency 32
+"""
+import sys
+import json
+import time
+import argparse
+import datetime
+import threading
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from benchmark import CallCounter, install_stand_ins, load_data, percentile
+
+def load_capture(path: str, endpoints=None, limit: int | None = None):
+    entries = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            entry = json.loads(line)
+            if endpoints and (entry.get("endpoint") or entry["path"]) not in endpoints:
+                continue
+            entries.append(entry)
+    entries.sort(key=lambda e: e["ts"])
+    return entries[:limit] if limit else entries
+
+def with_user(entry):
+    """Captured auth headers are dropped; pass the resolved user id the way the API accepts it."""
+    query, body = dict(entry.get("query") or {}), entry.get("body")
+    uid = entry.get("user_id")
+    if uid:
+        if entry["method"] == "GET":
+            query.setdefault("user_id", uid)
+        elif isinstance(body, dict):
+            body = dict(body, user_id=body.get("user_id") or uid)
+    return query, body
+
+class HttpTarget:
+    def __init__(self, base_url: str, pool_size: int):
+        import requests
+        from requests.adapters import HTTPAdapter
+        self.base_url = base_url.rstrip("/")
+        self._session = requests.Session()
+        self._session.mount("http://", HTTPAdapter(pool_maxsize=pool_size))
+        self._session.mount("https://", HTTPAdapter(pool_maxsize=pool_size))
+
+    def send(self, entry):
+        query, body = with_user(entry)
+        resp = self._session.request(entry["method"], self.base_url + entry["path"], params=query,
+                                     json=body if body is not None else None, timeout=60)
+        return resp.status_code, len(resp.content)
+
+class InProcessTarget:
+    def __init__(self, app):
+        self._app = app
+        self._local = threading.local()
+
+    def send(self, entry):
+        if not hasattr(self._local, "client"):
+            self._local.client = self._app.test_client()
+        query, body = with_user(entry)
+        resp = self._local.client.open(entry["path"], method=entry["method"], query_string=query,
+                                       json=body if body is not None else None)
+        return resp.status_code, len(resp.get_data())
+
+def summarize(latencies):
+    latencies = sorted(latencies)
+    if not latencies:
+        return {}
+    return {"count": len(latencies), "mean": round(sum(latencies) / len(latencies), 2),
+            "p50": round(percentile(latencies, 50), 2), "p95": round(percentile(latencies, 95), 2),
+            "p99": round(percentile(latencies, 99), 2), "max": round(latencies[-1], 2)}
+
+def replay(entries, target, speed: float | None, concurrency: int):
+    """Sends each entry at its (scaled) captured offset; speed None = as fast as possible."""
+    lock = threading.Lock()
+    latencies = defaultdict(list)
+    statuses = defaultdict(Counter)
+    lags = []
+    base_ts = entries[0]["ts"]
+    started = time.perf_counter()
+
+    def one(entry, due):
+        sent = time.perf_counter()
+        try:
+            status, _ = target.send(entry)
+        except Exception as e:
+            status = type(e).__name__
+        elapsed = (time.perf_counter() - sent) * 1000.0
+        name = entry.get("endpoint") or entry["path"]
+        with lock:
+            latencies[name].append(elapsed)
+            statuses[name][str(status)] += 1
+            if due is not None:
+                lags.append(max(0.0, (sent - due) * 1000.0))
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for entry in entries:
+            due = None
+            if speed:
+                due = started + (entry["ts"] - base_ts) / speed
+                delay = due - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            pool.submit(one, entry, due)
+    wall = time.perf_counter() - started
+
+    per_endpoint = {name: dict(summarize(vals), statuses=dict(statuses[name])) for name, vals in latencies.items()}
+    everything = [v for vals in latencies.values() for v in vals]
+    captured_span = entries[-1]["ts"] - base_ts
+    return {
+        "requests": len(entries),
+        "wall_seconds": round(wall, 3),
+        "captured_seconds": round(captured_span, 3),
+        "rps": round(len(entries) / wall, 1) if wall else 0.0,
+        "latency_ms": summarize(everything),
+        # How late requests left relative to the schedule; large values mean the replayer saturated
+        "schedule_lag_ms": summarize(lags) if lags else None,
+        "endpoints": per_endpoint,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay captured API traffic.")
+    parser.add_argument("capture")
+    parser.add_argument("--target", help="base URL of a running server")
+    parser.add_argument("--in-process", action="store_true", help="replay against the app with offline stand-ins")
+    parser.add_argument("--speed", default="1", help="time multiplier (1, 2.5, 10, ...) or 'max'")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--endpoints", help="comma-separated route patterns to keep")
+    parser.add_argument("--limit", type=int)
+    parser.add_argument("--llm-latency-ms", type=float, default=300.0)
+    parser.add_argument("--embed-latency-ms", type=float, default=60.0)
+    parser.add_argument("--out", help="write the report as JSON")
+    args = parser.parse_args()
+
+    if bool(args.target) == args.in_process:
+        parser.error("pass exactly one of --target or --in-process")
+    speed = None if args.speed == "max" else float(args.speed)
+    if speed is not None and speed <= 0:
+        parser.error("--speed must be positive or 'max'")
+    endpoints = set(args.endpoints.split(",")) if args.endpoints else None
+    entries = load_capture(args.capture, endpoints, args.limit)
+    if not entries:
+        sys.exit("Capture is empty (after filtering)")
+
+    if args.in_process:
+        args.vector_backend = "qdrant"
+        install_stand_ins(args, CallCounter())
+        import logging
+        logging.disable(logging.WARNING)
+        load_data(20, np.random.default_rng(0))
+        from app import app
+        target = InProcessTarget(app)
+    else:
+        target = HttpTarget(args.target, args.concurrency)
+
+    report = replay(entries, target, speed, args.concurrency)
+    report.update({"capture": args.capture, "speed": args.speed, "concurrency": args.concurrency,
+                   "finished_at": datetime.datetime.utcnow().isoformat()})
+
+    lat = report["latency_ms"]
+    print(f"{report['requests']} requests in {report['wall_seconds']}s "
+          f"(captured span {report['captured_seconds']}s, speed {args.speed}) -> {report['rps']} rps")
+    print(f"overall  p50 {lat['p50']} ms  p95 {lat['p95']} ms  p99 {lat['p99']} ms  max {lat['max']} ms")
+    if report["schedule_lag_ms"]:
+        print(f"schedule lag p95 {report['schedule_lag_ms']['p95']} ms")
+    for name, st in sorted(report["endpoints"].items()):
+        print(f"  {name:<32} n={st['count']:<5} p50 {st['p50']:>8} p95 {st['p95']:>8} p99 {st['p99']:>8}  {st['statuses']}")
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote {args.out}")
+
+if __name__ == "__main__":
+    main()